@@ -1,14 +1,16 @@
 import asyncio
 import datetime
-import json
 import os
 import re
 
 import discord
 from discord.ext import tasks, commands
 
+import database
+import storage
 import utils
 from help.help import help, handle_error, help_category
+from reaction_router import REACTION_REMOVE
 
 
 
@@ -19,85 +21,152 @@ from help.help import help, handle_error, help_category
 class AppointmentsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
+        self.reactions = bot.get_cog("ReactionRouter")
         self.fmt = os.getenv("DISCORD_DATE_TIME_FORMAT")
-        self.timer.start()
+        self.timers = bot.get_cog("Timers")
+        self.timers.register("appointment", self.handle_timer)
+        self.db = database.db
         self.appointments = {}
+        self.reconciled = asyncio.Event()
         self.app_file = os.getenv("DISCORD_APPOINTMENTS_FILE")
         self.load_appointments()
+        self.reconcile.start()
 
     def load_appointments(self):
         """ Loads all appointments from APPOINTMENTS_FILE """
 
-        appointments_file = open(self.app_file, mode='r')
-        self.appointments = json.load(appointments_file)
-
-    @tasks.loop(minutes=1)
-    async def timer(self):
-        delete = []
+        self.appointments = self.db.load_appointments() if self.db else storage.load(self.app_file)
 
         for channel_id, channel_appointments in self.appointments.items():
-            channel = None
-            for message_id, appointment in channel_appointments.items():
-                now = datetime.datetime.now()
+            for message_id in channel_appointments.keys():
+                self.register_reactions(message_id)
+                self.schedule(channel_id, message_id)
+
+    def register_reactions(self, message_id):
+        self.reactions.add_message(message_id, self.handle_reactions, emojis=["🗑️", "👍"])
+        self.reactions.add_message(message_id, self.handle_reaction_removed, emojis=["👍"],
+                                   event_type=REACTION_REMOVE)
+
+    def remove_appointment(self, channel_id, message_id):
+        channel_appointments = self.appointments.get(str(channel_id))
+        if channel_appointments and channel_appointments.pop(str(message_id), None):
+            self.reactions.remove_message(message_id)
+            self.unschedule(message_id)
+            if self.db:
+                self.db.delete_appointment(message_id)
+            else:
+                self.save_appointments()
+            return True
+        return False
+
+    def fire_time(self, appointment):
+        """ Returns the point in time, when the next notification for this appointment is due """
+
+        date_time = datetime.datetime.strptime(appointment["date_time"], self.fmt)
+        return date_time - datetime.timedelta(minutes=appointment["reminder"])
+
+    def schedule(self, channel_id, message_id):
+        """ (Re-)Schedule the next notification of an appointment """
+
+        appointment = self.appointments[str(channel_id)][str(message_id)]
+        self.timers.schedule("appointment", self.fire_time(appointment),
+                             {"channel_id": str(channel_id), "message_id": str(message_id)},
+                             key=f"appointment:{message_id}")
+
+    def unschedule(self, message_id):
+        self.timers.cancel(f"appointment:{message_id}")
+
+    async def handle_timer(self, payload):
+        await self.reconciled.wait()
+        await self.notify(payload["channel_id"], payload["message_id"])
+
+    async def notify(self, channel_id, message_id):
+        channel_appointments = self.appointments.get(channel_id)
+        appointment = channel_appointments.get(message_id) if channel_appointments else None
+        if not appointment:
+            return
+
+        channel = None
+        done = False
+        try:
+            now = datetime.datetime.now()
+            date_time = datetime.datetime.strptime(appointment["date_time"], self.fmt)
+            channel = await self.resolver.channel(channel_id)
+            diff = int(round(((date_time - now).total_seconds() / 60), 0))
+            answer = f"Benachrichtigung!\nDer Termin \"{appointment['title']}\" ist "
+
+            if appointment["reminder"] > 0 and diff > 0:
+                answer += f"in {diff} Minuten fällig."
+                if (reminder := appointment.get("reminder")) and appointment.get("recurring"):
+                    appointment["original_reminder"] = str(reminder)
+                appointment["reminder"] = 0
+            else:
+                answer += f"jetzt fällig. :loudspeaker: "
+                done = True
+
+            answer += f"\n"
+            for user_id in appointment.get("subscribers", []):
+                answer += f"<@!{str(user_id)}>"
+
+            await channel.send(answer)
+
+            if done:
+                await channel.get_partial_message(int(message_id)).delete()
+            else:
+                self.schedule(channel_id, message_id)
+                self.save_appointment(channel_id, message_id)
+        except discord.errors.NotFound:
+            done = True
+
+        if done:
+            if appointment.get("recurring") and channel:
+                recurring = appointment["recurring"]
                 date_time = datetime.datetime.strptime(appointment["date_time"], self.fmt)
-                remind_at = date_time - datetime.timedelta(minutes=appointment["reminder"])
-
-                if now >= remind_at:
-                    try:
-                        channel = await self.bot.fetch_channel(int(channel_id))
-                        message = await channel.fetch_message(int(message_id))
-                        reactions = message.reactions
-                        diff = int(round(((date_time - now).total_seconds() / 60), 0))
-                        answer = f"Benachrichtigung!\nDer Termin \"{appointment['title']}\" ist "
-
-                        if appointment["reminder"] > 0 and diff > 0:
-                            answer += f"in {diff} Minuten fällig."
-                            if (reminder := appointment.get("reminder")) and appointment.get("recurring"):
-                                appointment["original_reminder"] = str(reminder)
-                            appointment["reminder"] = 0
-                        else:
-                            answer += f"jetzt fällig. :loudspeaker: "
-                            delete.append(message_id)
-
-                        answer += f"\n"
-                        for reaction in reactions:
-                            if reaction.emoji == "👍":
-                                async for user in reaction.users():
-                                    if user != self.bot.user:
-                                        answer += f"<@!{str(user.id)}>"
-
-                        await channel.send(answer)
-
-                        if str(message.id) in delete:
-                            await message.delete()
-                    except discord.errors.NotFound:
-                        delete.append(message_id)
+                new_date_time = date_time + datetime.timedelta(minutes=recurring)
+                new_date_time_str = new_date_time.strftime(self.fmt)
+                splitted_new_date_time_str = new_date_time_str.split(" ")
+                reminder = appointment.get("original_reminder")
+                reminder = reminder if reminder else 0
+                await self.add_appointment(channel, appointment["author_id"],
+                                           splitted_new_date_time_str[0],
+                                           splitted_new_date_time_str[1],
+                                           str(reminder),
+                                           appointment["title"],
+                                           str(recurring))
+            self.remove_appointment(channel_id, message_id)
+
+    @tasks.loop(count=1)
+    async def reconcile(self):
+        """ Catch up with reactions, that were added or removed while the bot was offline. """
+
+        for channel_id, channel_appointments in list(self.appointments.items()):
+            for message_id, appointment in list(channel_appointments.items()):
+                try:
+                    message = await self.resolver.message(channel_id, message_id)
+                    subscribers = []
+                    for reaction in message.reactions:
+                        if reaction.emoji == "👍":
+                            async for user in reaction.users():
+                                if user != self.bot.user:
+                                    subscribers.append(user.id)
+                except discord.errors.NotFound:
+                    self.remove_appointment(channel_id, message_id)
+                    continue
+                except discord.errors.HTTPException as e:
+                    print(f"Can't reconcile appointment {message_id} in channel {channel_id}: {e!r}")
+                    continue  # keep the stored subscribers
 
-            if len(delete) > 0:
-                for key in delete:
-                    channel_appointment = channel_appointments.get(key)
-                    if channel_appointment:
-                        if channel_appointment.get("recurring"):
-                            recurring = channel_appointment["recurring"]
-                            date_time_str = channel_appointment["date_time"]
-                            date_time = datetime.datetime.strptime(date_time_str, self.fmt)
-                            new_date_time = date_time + datetime.timedelta(minutes=recurring)
-                            new_date_time_str = new_date_time.strftime(self.fmt)
-                            splitted_new_date_time_str = new_date_time_str.split(" ")
-                            reminder = channel_appointment.get("original_reminder")
-                            reminder = reminder if reminder else 0
-                            await self.add_appointment(channel, channel_appointment["author_id"],
-                                                       splitted_new_date_time_str[0],
-                                                       splitted_new_date_time_str[1],
-                                                       str(reminder),
-                                                       channel_appointment["title"],
-                                                       str(channel_appointment["recurring"]))
-                        channel_appointments.pop(key)
-                self.save_appointments()
+                appointment["subscribers"] = subscribers
+                self.save_appointment(channel_id, message_id)
+
+    @reconcile.before_loop
+    async def before_reconcile(self):
+        await self.bot.wait_until_ready()
 
-    @timer.before_loop
-    async def before_timer(self):
-        await asyncio.sleep(60 - datetime.datetime.now().second)
+    @reconcile.after_loop
+    async def after_reconcile(self):
+        self.reconciled.set()
 
     @help(
         category="appointments",
@@ -159,9 +228,11 @@ class AppointmentsCog(commands.Cog):
 
         channel_appointments = self.appointments.get(str(channel.id))
         channel_appointments[str(message.id)] = {"date_time": date_time.strftime(self.fmt), "reminder": reminder,
-                                                 "title": title, "author_id": author_id, "recurring": recurring}
-
-        self.save_appointments()
+                                                 "title": title, "author_id": author_id, "recurring": recurring,
+                                                 "subscribers": []}
+        self.register_reactions(message.id)
+        self.schedule(channel.id, message.id)
+        self.save_appointment(channel.id, message.id)
 
     @help(
         category="appointments",
@@ -178,7 +249,7 @@ class AppointmentsCog(commands.Cog):
 
             for message_id, appointment in channel_appointments.items():
                 try:
-                    message = await ctx.channel.fetch_message(int(message_id))
+                    message = await self.resolver.message(ctx.channel.id, message_id)
                     answer += f'{appointment["date_time"]}: {appointment["title"]} => ' \
                               f'{message.jump_url}\n'
                 except discord.errors.NotFound:
@@ -186,40 +257,54 @@ class AppointmentsCog(commands.Cog):
 
             if len(delete) > 0:
                 for key in delete:
-                    channel_appointments.pop(key)
-                self.save_appointments()
+                    self.remove_appointment(ctx.channel.id, key)
 
             await ctx.channel.send(answer)
         else:
             await ctx.send("Für diesen Channel existieren derzeit keine Termine")
 
     def save_appointments(self):
-        appointments_file = open(self.app_file, mode='w')
-        json.dump(self.appointments, appointments_file)
-
-    async def handle_reactions(self, payload):
-        channel = await self.bot.fetch_channel(payload.channel_id)
-        channel_appointments = self.appointments.get(str(payload.channel_id))
-        if channel_appointments:
-            appointment = channel_appointments.get(str(payload.message_id))
-            if appointment:
-                if payload.user_id == appointment["author_id"]:
-                    message = await channel.fetch_message(payload.message_id)
-                    await message.delete()
-                    channel_appointments.pop(str(payload.message_id))
-
-        self.save_appointments()
+        storage.save(self.app_file, self.appointments)
 
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.user_id == self.bot.user.id:
+    def save_appointment(self, channel_id, message_id):
+        """ Persist a single appointment. Without database the whole APPOINTMENTS_FILE is written. """
+
+        if self.db:
+            appointment = self.appointments[str(channel_id)][str(message_id)]
+            self.db.save_appointment(channel_id, message_id, appointment, self.fire_time(appointment))
+        else:
+            self.save_appointments()
+
+    def get_appointment(self, channel_id, message_id):
+        if channel_appointments := self.appointments.get(str(channel_id)):
+            return channel_appointments.get(str(message_id))
+        return None
+
+    async def handle_reactions(self, payload, message):
+        if not (appointment := self.get_appointment(payload.channel_id, payload.message_id)):
             return
 
-        if payload.emoji.name in ["🗑️"]:
-            channel = await self.bot.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            if len(message.embeds) > 0 and message.embeds[0].title == "Neuer Termin hinzugefügt!":
-                await self.handle_reactions(payload)
+        if payload.emoji.name == "👍":
+            subscribers = appointment.setdefault("subscribers", [])
+            if payload.user_id not in subscribers:
+                subscribers.append(payload.user_id)
+                self.save_appointment(payload.channel_id, payload.message_id)
+        elif payload.user_id == appointment["author_id"]:
+            channel = await self.resolver.channel(payload.channel_id)
+            await channel.get_partial_message(payload.message_id).delete()
+            self.remove_appointment(payload.channel_id, payload.message_id)
+
+    async def handle_reaction_removed(self, payload, message):
+        if not (appointment := self.get_appointment(payload.channel_id, payload.message_id)):
+            return
+
+        if payload.user_id in (subscribers := appointment.get("subscribers", [])):
+            subscribers.remove(payload.user_id)
+            self.save_appointment(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        self.remove_appointment(payload.channel_id, payload.message_id)
 
     async def cog_command_error(self, ctx, error):
         await handle_error(ctx, error)
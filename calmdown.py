@@ -1,11 +1,12 @@
 import datetime
-import json
 import os
 import re
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
+import database
+import storage
 import utils
 from help.help import help
 
@@ -18,47 +19,53 @@ from help.help import help
 class Calmdown(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
         self.role_id = int(os.getenv("DISCORD_CALMDOWN_ROLE"))
         self.file = os.getenv("DISCORD_CALMDOWN_FILE")
         self.fmt = os.getenv("DISCORD_DATE_TIME_FORMAT")
+        self.timers = bot.get_cog("Timers")
+        self.timers.register("calmdown", self.handle_timer)
+        self.db = database.db
         self.silenced_users = {}
         self.load()
-        self.timer.start()
-
 
     def load(self):
-        try:
-            file = open(self.file, mode='r')
-            self.silenced_users = json.load(file)
-        except FileNotFoundError:
-            pass
+        self.silenced_users = self.db.load_calmdowns() if self.db else storage.load(self.file, {})
+
+        for user_id, data in self.silenced_users.items():
+            if duration := data.get('duration'):
+                self.schedule(user_id, data['guild_id'], datetime.datetime.strptime(duration, self.fmt))
+
+    def schedule(self, user_id, guild_id, till):
+        self.timers.schedule("calmdown", till, {"user_id": str(user_id), "guild_id": str(guild_id)},
+                             key=f"calmdown:{user_id}")
 
     def save(self):
-        file = open(self.file, mode='w')
-        json.dump(self.silenced_users, file)
+        storage.save(self.file, self.silenced_users)
 
     async def unsilence(self, user, guild):
         role = guild.get_role(self.role_id)
         await user.remove_roles(role)
-        if self.silenced_users.get(user.id):
-            del self.silenced_users[user.id]
-            self.save()
+        self.timers.cancel(f"calmdown:{user.id}")
+        self.forget(user.id)
 
-    @tasks.loop(minutes=1)
-    async def timer(self):
-        now = datetime.datetime.now()
-        silenced_users = self.silenced_users.copy()
-        for user_id, data in silenced_users.items():
-            guild = await self.bot.fetch_guild(int(data['guild_id']))
-            user = await guild.fetch_member(int(user_id))
-            duration = data.get('duration')
-            if not duration:
-                return
-            till = datetime.datetime.strptime(duration, self.fmt)
-            if user and now >= till:
-                guild = await self.bot.fetch_guild(data['guild_id'])
-                await utils.send_dm(user, f"Du darfst die **stille Treppe** nun wieder verlassen.")
-                await self.unsilence(user, guild)
+    def forget(self, user_id):
+        if self.silenced_users.get(str(user_id)):
+            del self.silenced_users[str(user_id)]
+            if self.db:
+                self.db.delete_calmdown(user_id)
+            else:
+                self.save()
+
+    async def handle_timer(self, payload):
+        try:
+            guild = await self.resolver.guild(payload['guild_id'])
+            user = await self.resolver.member(guild.id, payload['user_id'])
+        except discord.errors.NotFound:
+            self.forget(payload['user_id'])  # left the server (or the server is gone), nothing to lift
+            return
+        await utils.send_dm(user, f"Du darfst die **stille Treppe** nun wieder verlassen.")
+        await self.unsilence(user, guild)
 
     @help(
         brief="Setzt einen User auf die stille Treppe.",
@@ -91,8 +98,12 @@ class Calmdown(commands.Cog):
                 return
             now = datetime.datetime.now()
             till = now + datetime.timedelta(minutes=duration)
-            self.silenced_users[user.id] = {"duration": till.strftime(self.fmt), "guild_id": guild.id}
-            self.save()
+            self.silenced_users[str(user.id)] = {"duration": till.strftime(self.fmt), "guild_id": guild.id}
+            if self.db:
+                self.db.save_calmdown(user.id, self.silenced_users[str(user.id)], till)
+            else:
+                self.save()
+            self.schedule(user.id, guild.id, till)
             await ctx.channel.send(f"{ctx.author.mention} hat {user.mention} auf die **stille Treppe** geschickt.")
             await user.add_roles(role)
             if duration < 300:
@@ -0,0 +1,292 @@
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+    Optionales SQLite-Backend für Termine, Lerngruppen, Auszeiten (stille Treppe) und Github-Ideen.
+
+    DISCORD_DATABASE_FILE - Name der SQLite Datenbank. Ist die Variable nicht gesetzt, werden weiterhin die
+                            JSON-Dateien verwendet.
+
+    Alle Zugriffe laufen in einem eigenen Thread, damit der Event-Loop nicht blockiert wird. Eine Änderung ist
+    ein einzelner Zeilen-Schreibzugriff statt die komplette Datei neu zu schreiben. Fällige Termine, die Lerngruppen
+    eines Besitzers und die offenen Lerngruppen eines Kurses werden über Indizes abgefragt (due_appointments,
+    groups_owned_by, open_groups).
+
+    Die bestehenden JSON-Dateien können einmalig mit `python database.py migrate` übernommen werden.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    message_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    date_time TEXT NOT NULL,
+    due REAL NOT NULL,
+    reminder INTEGER NOT NULL,
+    original_reminder TEXT,
+    title TEXT NOT NULL,
+    author_id INTEGER NOT NULL,
+    recurring INTEGER,
+    subscribers TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS appointments_due ON appointments (due);
+CREATE INDEX IF NOT EXISTS appointments_channel ON appointments (channel_id);
+
+CREATE TABLE IF NOT EXISTS learninggroups (
+    channel_id TEXT PRIMARY KEY,
+    owner_id INTEGER NOT NULL,
+    course TEXT NOT NULL,
+    name TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    is_open INTEGER NOT NULL,
+    last_rename INTEGER
+);
+CREATE INDEX IF NOT EXISTS learninggroups_owner ON learninggroups (owner_id);
+CREATE INDEX IF NOT EXISTS learninggroups_course ON learninggroups (course, is_open);
+
+CREATE TABLE IF NOT EXISTS learninggroup_requests (
+    message_id TEXT PRIMARY KEY,
+    owner_id INTEGER NOT NULL,
+    course TEXT NOT NULL,
+    name TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    is_open INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS learninggroup_requests_owner ON learninggroup_requests (owner_id);
+
+CREATE TABLE IF NOT EXISTS calmdowns (
+    user_id TEXT PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    duration TEXT NOT NULL,
+    due REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS calmdowns_due ON calmdowns (due);
+
+CREATE TABLE IF NOT EXISTS ideas (
+    message_id TEXT PRIMARY KEY,
+    created INTEGER NOT NULL,
+    number INTEGER,
+    html_url TEXT
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+GROUP_FIELDS = ["owner_id", "course", "name", "semester", "is_open"]
+
+db = None
+
+
+def open_database(filename):
+    global db
+    db = Database(filename)
+    return db
+
+
+def close_database():
+    if db:
+        db.close()
+
+
+class Database:
+    def __init__(self, filename):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        self.connection = None
+        self.run_sync(self.connect, filename)
+
+    def connect(self, filename):
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.run_sync(self.connection.close)
+        self.executor.shutdown(wait=True)
+
+    def run_sync(self, function, *args):
+        """ Run function in the database thread and wait for the result (only for startup and shutdown) """
+
+        return self.executor.submit(function, *args).result()
+
+    def run(self, function, *args):
+        return asyncio.wrap_future(self.executor.submit(function, *args))
+
+    def execute(self, sql, parameters=()):
+        with self.connection:
+            self.connection.execute(sql, parameters)
+
+    def execute_many(self, sql, rows):
+        with self.connection:
+            self.connection.executemany(sql, rows)
+
+    def fetch_all(self, sql, parameters=()):
+        return [dict(row) for row in self.connection.execute(sql, parameters).fetchall()]
+
+    def write(self, sql, parameters=()):
+        """ Queue a write. Writes are executed in order, but the caller does not wait for them. """
+
+        future = self.executor.submit(self.execute, sql, parameters)
+        future.add_done_callback(log_error)
+
+    async def query(self, sql, parameters=()):
+        return await self.run(self.fetch_all, sql, parameters)
+
+    # Appointments
+
+    def save_appointment(self, channel_id, message_id, appointment, due):
+        self.write("INSERT OR REPLACE INTO appointments (message_id, channel_id, date_time, due, reminder, "
+                   "original_reminder, title, author_id, recurring, subscribers) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (str(message_id), str(channel_id), appointment["date_time"], due.timestamp(),
+                    appointment["reminder"], appointment.get("original_reminder"), appointment["title"],
+                    appointment["author_id"], appointment.get("recurring"),
+                    json.dumps(appointment.get("subscribers", []))))
+
+    def delete_appointment(self, message_id):
+        self.write("DELETE FROM appointments WHERE message_id = ?", (str(message_id),))
+
+    def load_appointments(self):
+        appointments = {}
+        for row in self.run_sync(self.fetch_all, "SELECT * FROM appointments"):
+            appointment = {"date_time": row["date_time"], "reminder": row["reminder"], "title": row["title"],
+                           "author_id": row["author_id"], "recurring": row["recurring"],
+                           "subscribers": json.loads(row["subscribers"])}
+            if row["original_reminder"]:
+                appointment["original_reminder"] = row["original_reminder"]
+            appointments.setdefault(row["channel_id"], {})[row["message_id"]] = appointment
+        return appointments
+
+    async def due_appointments(self, until):
+        return await self.query("SELECT * FROM appointments WHERE due <= ? ORDER BY due", (until.timestamp(),))
+
+    # Learning groups
+
+    def save_group(self, channel_config):
+        self.write("INSERT OR REPLACE INTO learninggroups (channel_id, owner_id, course, name, semester, is_open, "
+                   "last_rename) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   (channel_config["channel_id"], *[channel_config[field] for field in GROUP_FIELDS],
+                    channel_config.get("last_rename")))
+
+    def delete_group(self, channel_id):
+        self.write("DELETE FROM learninggroups WHERE channel_id = ?", (str(channel_id),))
+
+    def save_group_request(self, message_id, channel_config):
+        self.write("INSERT OR REPLACE INTO learninggroup_requests (message_id, owner_id, course, name, semester, "
+                   "is_open) VALUES (?, ?, ?, ?, ?, ?)",
+                   (str(message_id), *[channel_config[field] for field in GROUP_FIELDS]))
+
+    def delete_group_request(self, message_id):
+        self.write("DELETE FROM learninggroup_requests WHERE message_id = ?", (str(message_id),))
+
+    def load_groups(self):
+        groups = {"requested": {}, "groups": {}}
+        for row in self.run_sync(self.fetch_all, "SELECT * FROM learninggroups"):
+            row["is_open"] = bool(row["is_open"])
+            if row["last_rename"] is None:
+                del row["last_rename"]
+            groups["groups"][row["channel_id"]] = row
+        for row in self.run_sync(self.fetch_all, "SELECT * FROM learninggroup_requests"):
+            row["is_open"] = bool(row["is_open"])
+            groups["requested"][row.pop("message_id")] = row
+        if (message_id := self.get_meta("learninggroups_messageid")) is not None:
+            groups["messageid"] = int(message_id)
+        return groups
+
+    async def groups_owned_by(self, owner_id):
+        return await self.query("SELECT * FROM learninggroups WHERE owner_id = ?", (owner_id,))
+
+    async def open_groups(self, course):
+        return await self.query("SELECT * FROM learninggroups WHERE course = ? AND is_open = 1 ORDER BY name",
+                                (str(course),))
+
+    # Calmdowns
+
+    def save_calmdown(self, user_id, data, due):
+        self.write("INSERT OR REPLACE INTO calmdowns (user_id, guild_id, duration, due) VALUES (?, ?, ?, ?)",
+                   (str(user_id), data["guild_id"], data["duration"], due.timestamp()))
+
+    def delete_calmdown(self, user_id):
+        self.write("DELETE FROM calmdowns WHERE user_id = ?", (str(user_id),))
+
+    def load_calmdowns(self):
+        return {row["user_id"]: {"duration": row["duration"], "guild_id": row["guild_id"]}
+                for row in self.run_sync(self.fetch_all, "SELECT * FROM calmdowns")}
+
+    # Github ideas
+
+    def save_idea(self, message_id, idea):
+        self.write("INSERT OR REPLACE INTO ideas (message_id, created, number, html_url) VALUES (?, ?, ?, ?)",
+                   (str(message_id), idea["created"], idea.get("number"), idea.get("html_url")))
+
+    def load_ideas(self):
+        ideas = {}
+        for row in self.run_sync(self.fetch_all, "SELECT * FROM ideas"):
+            idea = {"created": bool(row["created"])}
+            if row["number"] is not None:
+                idea["number"] = row["number"]
+                idea["html_url"] = row["html_url"]
+            ideas[row["message_id"]] = idea
+        return ideas
+
+    # Meta
+
+    def set_meta(self, key, value):
+        self.write("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def get_meta(self, key):
+        rows = self.run_sync(self.fetch_all, "SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else None
+
+
+def log_error(future):
+    if exception := future.exception():
+        traceback.print_exception(type(exception), exception, exception.__traceback__)
+
+
+def migrate(database):
+    """ Copy the data of the existing JSON files into the database """
+
+    import storage
+
+    fmt = os.getenv("DISCORD_DATE_TIME_FORMAT")
+
+    for channel_id, channel_appointments in storage.load(os.getenv("DISCORD_APPOINTMENTS_FILE"), {}).items():
+        for message_id, appointment in channel_appointments.items():
+            due = datetime.datetime.strptime(appointment["date_time"], fmt) \
+                  - datetime.timedelta(minutes=appointment["reminder"])
+            database.save_appointment(channel_id, message_id, appointment, due)
+
+    groups = storage.load(os.getenv("DISCORD_LEARNINGGROUPS_FILE"), {"requested": {}, "groups": {}})
+    for channel_config in groups["groups"].values():
+        database.save_group(channel_config)
+    for message_id, channel_config in groups["requested"].items():
+        database.save_group_request(message_id, channel_config)
+    if message_id := groups.get("messageid"):
+        database.set_meta("learninggroups_messageid", message_id)
+
+    for user_id, data in storage.load(os.getenv("DISCORD_CALMDOWN_FILE"), {}).items():
+        database.save_calmdown(user_id, data, datetime.datetime.strptime(data["duration"], fmt))
+
+    for message_id, idea in storage.load("github.json", {}).items():
+        database.save_idea(message_id, idea)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python database.py migrate")
+        sys.exit(1)
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    database = open_database(os.getenv("DISCORD_DATABASE_FILE"))
+    migrate(database)
+    database.close()
+    print("Migration finished")
@@ -1,8 +1,8 @@
-import json
 import random
 import discord
 from discord.ext import commands, tasks
 from help.help import help, handle_error
+import storage
 
 
 class EasterCog(commands.Cog):
@@ -13,12 +13,10 @@ class EasterCog(commands.Cog):
         # self.reaction_timer.start()
 
     def load_data(self):
-        data_file = open("easter.json", mode="r")
-        return json.load(data_file)
+        return storage.load("easter.json")
 
     def save_data(self):
-        data_file = open("easter.json", mode="w")
-        json.dump(self.data, data_file)
+        storage.save("easter.json", self.data)
 
     # @commands.Cog.listener(name="on_message")
     # async def hide(self, message):
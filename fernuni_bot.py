@@ -9,17 +9,23 @@ from appointments_cog import AppointmentsCog
 from armin import Armin
 from calmdown import Calmdown
 from christmas_cog import ChristmasCog
+import database
 from easter_cog import EasterCog
 from github import Github
 from help.help import Help
 from learninggroups import LearningGroups
+from member_stats import MemberStats
 from links_cog import LinksCog
 from module_information.module_information import ModuleInformation
 from news_cog import NewsCog
 from poll_cog import PollCog
+from reaction_router import ReactionRouter, REACTION_REMOVE
+from resolver import Resolver
 from roles_cog import RolesCog
+import storage
 from support_cog import SupportCog
 from text_commands_cog import TextCommandsCog
+from timers import Timers
 # from change_log import ChangeLogCog
 from voice_cog import VoiceCog
 from welcome_cog import WelcomeCog
@@ -35,12 +41,20 @@ OWNER = int(os.getenv('DISCORD_OWNER'))
 ROLES_FILE = os.getenv('DISCORD_ROLES_FILE')
 HELP_FILE = os.getenv('DISCORD_HELP_FILE')
 CATEGORY_LERNGRUPPEN = os.getenv("DISCORD_CATEGORY_LERNGRUPPEN")
+DATABASE_FILE = os.getenv("DISCORD_DATABASE_FILE")
 PIN_EMOJI = "📌"
 
+if DATABASE_FILE:
+    database.open_database(DATABASE_FILE)
+
 intents = discord.Intents.default()
 intents.members = True
 bot = commands.Bot(command_prefix='!', help_command=None, activity=discord.Game(ACTIVITY), owner_id=OWNER,
                    intents=intents)
+bot.add_cog(Resolver(bot))
+bot.add_cog(ReactionRouter(bot))
+bot.add_cog(Timers(bot))
+bot.add_cog(MemberStats(bot))
 bot.add_cog(AppointmentsCog(bot))
 bot.add_cog(TextCommandsCog(bot))
 bot.add_cog(PollCog(bot))
@@ -93,29 +107,23 @@ async def on_ready():
     print("Client started!")
 
 
-@bot.event
-async def on_raw_reaction_add(payload):
-    if payload.user_id == bot.user.id:
-        return
+async def handle_pin_reaction(payload, message):
+    await pin_message(message)
 
-    if payload.emoji.name == PIN_EMOJI:
-        channel = await bot.fetch_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        await pin_message(message)
 
+async def handle_unpin_reaction(payload, message):
+    await unpin_message(message)
 
-@bot.event
-async def on_raw_reaction_remove(payload):
-    if payload.emoji.name == PIN_EMOJI:
-        channel = await bot.fetch_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        await unpin_message(message)
+
+reactions = bot.get_cog("ReactionRouter")
+reactions.add_emoji(PIN_EMOJI, handle_pin_reaction, fetch=True)
+reactions.add_emoji(PIN_EMOJI, handle_unpin_reaction, fetch=True, event_type=REACTION_REMOVE)
 
 
 @bot.event
 async def on_voice_state_update(member, before, after):
     if before.channel != after.channel and after.channel and "Lerngruppen-Voice" in after.channel.name:
-        category = await bot.fetch_channel(CATEGORY_LERNGRUPPEN)
+        category = await bot.get_cog("Resolver").channel(CATEGORY_LERNGRUPPEN)
         voice_channels = category.voice_channels
 
         for voice_channel in voice_channels:
@@ -126,3 +134,7 @@ async def on_voice_state_update(member, before, after):
 
 
 bot.run(TOKEN)
+try:
+    storage.flush()
+finally:
+    database.close_database()
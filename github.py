@@ -1,10 +1,11 @@
 import base64
-import json
 import os
 
 from aiohttp import ClientSession
 from discord.ext import commands
 
+import database
+import storage
 import utils
 from help.help import help, handle_error, help_category
 
@@ -14,15 +15,29 @@ class Github(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.github_file = "github.json"
+        self.reactions = bot.get_cog("ReactionRouter")
+        self.db = database.db
         self.data = self.load()
 
+        for message_id, idea in self.data.items():
+            if not idea.get("created"):
+                self.register_reactions(message_id)
+
     def load(self):
-        github_file = open(self.github_file, 'r')
-        return json.load(github_file)
+        return self.db.load_ideas() if self.db else storage.load(self.github_file)
 
     def save(self):
-        github_file = open(self.github_file, 'w')
-        json.dump(self.data, github_file)
+        storage.save(self.github_file, self.data)
+
+    def save_idea(self, message_id):
+        if self.db:
+            self.db.save_idea(message_id, self.data[str(message_id)])
+        else:
+            self.save()
+
+    def register_reactions(self, message_id):
+        self.reactions.add_message(message_id, self.handle_idea_reaction, emojis=[int(os.getenv("DISCORD_IDEE_EMOJI"))],
+                                   fetch=True)
 
     @help(
         category="github",
@@ -39,8 +54,9 @@ class Github(commands.Cog):
     async def cmd_idee(self, ctx):
         if ctx.channel.id == int(os.getenv("DISCORD_IDEE_CHANNEL")):
             self.data[str(ctx.message.id)] = {"created": False}
+            self.register_reactions(ctx.message.id)
             await ctx.message.add_reaction(self.bot.get_emoji(int(os.getenv("DISCORD_IDEE_EMOJI"))))
-            self.save()
+            self.save_idea(ctx.message.id)
 
     @help(
         category="github",
@@ -57,23 +73,16 @@ class Github(commands.Cog):
     async def cmd_card(self, ctx):
         self.data[str(ctx.message.id)] = {"created": False}
         await self.create_issue(self.data[str(ctx.message.id)], ctx.message)
-        self.save()
-
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.member == self.bot.user:
-            return
+        self.save_idea(ctx.message.id)
 
+    async def handle_idea_reaction(self, payload, message):
         if idea := self.data.get(str(payload.message_id)):
-            if payload.emoji.id == int(os.getenv("DISCORD_IDEE_EMOJI")):
-                channel = await self.bot.fetch_channel(payload.channel_id)
-                message = await channel.fetch_message(payload.message_id)
-                for reaction in message.reactions:
-                    if reaction.emoji.id == int(os.getenv("DISCORD_IDEE_EMOJI")):
-                        if reaction.count >= int(os.getenv("DISCORD_IDEE_REACT_QTY")) and not idea.get("created"):
-                            await self.create_issue(idea, message)
+            for reaction in message.reactions:
+                if getattr(reaction.emoji, "id", None) == int(os.getenv("DISCORD_IDEE_EMOJI")):
+                    if reaction.count >= int(os.getenv("DISCORD_IDEE_REACT_QTY")) and not idea.get("created"):
+                        await self.create_issue(idea, message)
 
-                            self.save()
+                        self.save_idea(message.id)
 
     async def cog_command_error(self, ctx, error):
         await handle_error(ctx, error)
@@ -94,6 +103,7 @@ class Github(commands.Cog):
                     idea["created"] = True
                     idea["number"] = js["number"]
                     idea["html_url"] = js["html_url"]
+                    self.reactions.remove_message(message.id)
 
                     await message.reply(
                         f"Danke <@!{message.author.id}> für deinen Vorschlag. Ich habe für dich gerade folgenden Issue in Github erstellt: {idea['html_url']}")
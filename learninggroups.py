@@ -1,8 +1,9 @@
-import json
 import os
 import time
 import re
 import discord
+import database
+import storage
 import utils
 from discord.ext import commands
 from help.help import help, handle_error, help_category
@@ -23,6 +24,8 @@ from help.help import help, handle_error, help_category
 class LearningGroups(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
+        self.reactions = bot.get_cog("ReactionRouter")
         # ratelimit 2 in 10 minutes (305 * 2 = 610 = 10 minutes and 10 seconds)
         self.rename_ratelimit = 305
         self.category_open = os.getenv('DISCORD_LEARNINGGROUPS_OPEN')
@@ -33,26 +36,43 @@ class LearningGroups(commands.Cog):
         self.group_file = os.getenv('DISCORD_LEARNINGGROUPS_FILE')
         self.header_file = os.getenv('DISCORD_LEARNINGGROUPS_COURSE_FILE')
         self.mod_role = os.getenv("DISCORD_MOD_ROLE")
+        self.db = database.db
         self.groups = {}
         self.header = {}
         self.load_groups()
         self.load_header()
 
     def load_header(self):
-        file = open(self.header_file, mode='r')
-        self.header = json.load(file)
+        self.header = storage.load(self.header_file)
 
     def save_header(self):
-        file = open(self.header_file, mode='w')
-        json.dump(self.header, file)
+        storage.save(self.header_file, self.header)
 
     def load_groups(self):
-        group_file = open(self.group_file, mode='r')
-        self.groups = json.load(group_file)
+        self.groups = self.db.load_groups() if self.db else storage.load(self.group_file)
+
+        for message_id in self.groups["requested"].keys():
+            self.register_reactions(message_id)
+
+    def register_reactions(self, message_id):
+        self.reactions.add_message(message_id, self.handle_request_reaction, emojis=["👍", "🗑️"])
 
     def save_groups(self):
-        group_file = open(self.group_file, mode='w')
-        json.dump(self.groups, group_file)
+        storage.save(self.group_file, self.groups)
+
+    def save_group(self, channel_config):
+        """ Persist a single group. Without database the whole group file is written. """
+
+        if self.db:
+            self.db.save_group(channel_config)
+        else:
+            self.save_groups()
+
+    def save_group_request(self, message_id):
+        if self.db:
+            self.db.save_group_request(message_id, self.groups["requested"][str(message_id)])
+        else:
+            self.save_groups()
 
     def arg_open_to_bool(self, arg_open):
         if arg_open in ["offen", "open"]:
@@ -105,13 +125,13 @@ class LearningGroups(commands.Cog):
         now = int(time.time())
         seconds = channel_config["last_rename"] + self.rename_ratelimit - now
         if seconds > 0:
-            channel = await self.bot.fetch_channel(int(channel_config["channel_id"]))
+            channel = await self.resolver.channel(channel_config["channel_id"])
             await channel.send(f"Fehler! Du kannst diese Aktion erst wieder in {seconds} Sekunden ausführen.")
         return seconds > 0
 
     async def category_of_channel(self, is_open):
         category_to_fetch = self.category_open if is_open else self.category_close
-        category = await self.bot.fetch_channel(category_to_fetch)
+        category = await self.resolver.channel(category_to_fetch)
         return category
 
     def full_channel_name(self, channel_config):
@@ -135,21 +155,23 @@ class LearningGroups(commands.Cog):
                     msg += f"**{group['course']} - -------------------------------------**\n"
                 courseheader = group['course']
 
-            groupchannel = await self.bot.fetch_channel(int(group['channel_id']))
+            groupchannel = await self.resolver.channel(group['channel_id'])
             msg += f"    {groupchannel.mention}\n"
 
-        channel = await self.bot.fetch_channel(int(self.channel_info))
-
         if (info_message_id == None):
+            channel = await self.resolver.channel(self.channel_info)
             message = await channel.send(msg)
         else:
-            message = await channel.fetch_message(int(info_message_id))
+            message = await self.resolver.message(self.channel_info, info_message_id)
             await message.edit(content=msg)
         self.groups["messageid"] = message.id
-        self.save_groups()
+        if self.db:
+            self.db.set_meta("learninggroups_messageid", message.id)
+        else:
+            self.save_groups()
 
     async def archive(self, channel):
-        category = await self.bot.fetch_channel(self.category_archive)
+        category = await self.resolver.channel(self.category_archive)
         await self.move_channel(channel, category)
         await channel.edit(name=f"archiv-${channel.name[1:]}")
         self.remove_group(channel)
@@ -170,7 +192,7 @@ class LearningGroups(commands.Cog):
         category = await self.category_of_channel(is_open)
         await self.move_channel(channel, category)
         await self.update_groupinfo()
-        self.save_groups()
+        self.save_group(channel_config)
 
     async def set_channel_name(self, channel, name):
         channel_config = self.groups["groups"][str(channel.id)]
@@ -183,7 +205,7 @@ class LearningGroups(commands.Cog):
 
         await channel.edit(name=self.full_channel_name(channel_config))
         await self.update_groupinfo()
-        self.save_groups()
+        self.save_group(channel_config)
 
     async def move_channel(self, channel, category):
         for sortchannel in category.text_channels:
@@ -200,26 +222,33 @@ class LearningGroups(commands.Cog):
         channel = await category.create_text_channel(channel_name)
         channel_config["channel_id"] = str(channel.id)
 
-        user = await self.bot.fetch_user(channel_config["owner_id"])
+        user = await self.resolver.user(channel_config["owner_id"])
         await utils.send_dm(user,
                             f"Deine Lerngruppe <#{channel.id}> wurde eingerichtet. Du kannst mit **!open** und **!close** den Status dieser Gruppe setzen. Bedenke aber bitte, dass die Discord API die möglichen Namensänderungen stark limitiert. Daher ist nur ein Statuswechsel alle **5 Minuten** möglich.")
 
         self.groups["groups"][str(channel.id)] = channel_config
+        self.save_group(channel_config)
 
         self.remove_group_request(message)
         if not direct:
             await message.delete()
 
         await self.update_groupinfo()
-        self.save_groups()
 
     def remove_group_request(self, message):
         del self.groups["requested"][str(message.id)]
-        self.save_groups()
+        self.reactions.remove_message(message.id)
+        if self.db:
+            self.db.delete_group_request(message.id)
+        else:
+            self.save_groups()
 
     def remove_group(self, channel):
         del self.groups["groups"][str(channel.id)]
-        self.save_groups()
+        if self.db:
+            self.db.delete_group(channel.id)
+        else:
+            self.save_groups()
 
     @help(
         category="learninggroups",
@@ -264,9 +293,11 @@ class LearningGroups(commands.Cog):
                 self.groups["groups"][str(channel.id)] = channel_config
                 msg += f"   #{course}-{name}-{semester}\n"
 
+        for channel_config in self.groups["groups"].values():
+            self.save_group(channel_config)
+
         await utils.send_dm(ctx.author, msg)
         await self.update_groupinfo()
-        self.save_groups()
 
     @help(
         category="learninggroups",
@@ -316,7 +347,7 @@ class LearningGroups(commands.Cog):
             return
 
         self.groups["requested"][str(ctx.message.id)] = channel_config
-        self.save_groups()
+        self.save_group_request(ctx.message.id)
         await self.add_requested_group_channel(ctx.message, direct=True)
 
     @help(
@@ -347,13 +378,14 @@ class LearningGroups(commands.Cog):
                               description=f"<@!{ctx.author.id}> möchte gerne die Lerngruppe **#{channel_name}** eröffnen",
                               color=19607)
 
-        channel_request = await self.bot.fetch_channel(int(self.channel_request))
+        channel_request = await self.resolver.channel(self.channel_request)
         message = await channel_request.send(embed=embed)
         await message.add_reaction("👍")
         await message.add_reaction("🗑️")
 
         self.groups["requested"][str(message.id)] = channel_config
-        self.save_groups()
+        self.register_reactions(message.id)
+        self.save_group_request(message.id)
 
     @help(
         category="learninggroups",
@@ -423,7 +455,7 @@ class LearningGroups(commands.Cog):
         channel_config = self.groups["groups"].get(str(ctx.channel.id))
         if channel_config:
             channel_config["owner_id"] = arg_owner.id
-            self.save_groups()
+            self.save_group(channel_config)
             await ctx.channel.send(f"Glückwunsch {arg_owner.mention}! Du bist jetzt die Besitzerin dieser Lerngruppe.")
 
     @help(
@@ -438,22 +470,21 @@ class LearningGroups(commands.Cog):
         channel_config = self.groups["groups"].get(str(ctx.channel.id))
         owner_id = channel_config.get("owner_id")
         if owner_id:
-            user = await self.bot.fetch_user(owner_id)
+            user = await self.resolver.user(owner_id)
             await ctx.channel.send(f"Besitzer: @{user.name}")
 
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.user_id == self.bot.user.id:
+    async def handle_request_reaction(self, payload, message):
+        request = self.groups["requested"].get(str(payload.message_id))
+        if not request:
             return
 
-        channel = await self.bot.fetch_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        request = self.groups["requested"].get(str(message.id))
+        channel = await self.resolver.channel(payload.channel_id)
+        message = channel.get_partial_message(payload.message_id)
 
-        if payload.emoji.name in ["👍"] and self.is_group_request_message(message) and self.is_mod(payload.member):
+        if payload.emoji.name in ["👍"] and self.is_mod(payload.member):
             await self.add_requested_group_channel(message, direct=False)
 
-        if payload.emoji.name in ["🗑️"] and self.is_group_request_message(message) and (
+        if payload.emoji.name in ["🗑️"] and (
                 self.is_request_owner(request, payload.member) or self.is_mod(payload.member)):
             self.remove_group_request(message)
             await message.delete()
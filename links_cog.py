@@ -1,8 +1,7 @@
-import json
-
 import discord
 from discord.ext import commands
 from help.help import help, handle_error, help_category
+import storage
 
 
 @help_category("links", "Links", "Feature zum Verwalten von Links innerhalb eines Channels.")
@@ -14,12 +13,10 @@ class LinksCog(commands.Cog):
         self.load_links()
 
     def load_links(self):
-        links_file = open(self.links_file, 'r')
-        self.links = json.load(links_file)
+        self.links = storage.load(self.links_file)
 
     def save_links(self):
-        links_file = open(self.links_file, 'w')
-        json.dump(self.links, links_file)
+        storage.save(self.links_file, self.links)
 
     @help(
         category="links",
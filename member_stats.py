@@ -0,0 +1,117 @@
+import os
+import time
+from collections import Counter
+
+from discord.ext import commands, tasks
+
+from stats_history import History
+
+"""
+    Laufend aktualisierte Mitgliederzahlen des Servers (DISCORD_GUILD), insgesamt und pro Rolle.
+
+    Die Zahlen werden beim Start einmal aus dem Member-Cache von discord.py gezählt und danach über die Events
+    on_member_join, on_member_remove und on_member_update (geänderte Rollen) nachgeführt. Abfragen brauchen damit
+    weder die REST-API noch einen Durchlauf über alle Mitglieder.
+
+    DISCORD_STATS_HISTORY_DIR - (optional) Verzeichnis für den Verlauf der Mitgliederzahlen (siehe stats_history).
+                                Ist es gesetzt, werden die Zahlen regelmäßig gespeichert.
+    DISCORD_STATS_SAMPLE_INTERVAL - (optional) Abstand der Messungen in Minuten, Standard ist 60.
+"""
+
+MEMBERS = "members"
+WITHOUT_ROLE = "without_role"
+
+
+class MemberStats(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.guild_id = int(os.getenv("DISCORD_GUILD"))
+        self.seeded = False
+        self.members = 0
+        self.without_role = 0
+        self.roles = Counter()
+        directory = os.getenv("DISCORD_STATS_HISTORY_DIR")
+        self.history = History(directory) if directory else None
+        if self.history:
+            self.sample_loop.change_interval(minutes=int(os.getenv("DISCORD_STATS_SAMPLE_INTERVAL", 60)))
+            self.sample_loop.start()
+
+    def cog_unload(self):
+        self.sample_loop.cancel()
+
+    def seed(self, guild):
+        """ Count members and roles once from the member cache """
+
+        self.members = 0
+        self.without_role = 0
+        self.roles = Counter()
+        for member in guild.members:
+            self.add(member.roles, 1)
+        self.seeded = True
+
+    def add(self, roles, count):
+        """ Add (count 1) or remove (count -1) a member with the given roles """
+
+        self.members += count
+        if len(roles) == 1:  # only @everyone
+            self.without_role += count
+        for role in roles:
+            self.roles[role.id] += count
+
+    def count(self, role):
+        return self.roles.get(role.id, 0)
+
+    def ensure_seeded(self, guild):
+        if not self.seeded:
+            self.seed(guild)
+
+    def sample(self, timestamp):
+        """ Append the current numbers (total, without role and per role) to the history """
+
+        self.history.append(MEMBERS, timestamp, self.members)
+        self.history.append(WITHOUT_ROLE, timestamp, self.without_role)
+        for role_id, count in self.roles.items():
+            if role_id != self.guild_id:  # @everyone
+                self.history.append(str(role_id), timestamp, count)
+
+    @tasks.loop(minutes=60)
+    async def sample_loop(self):
+        if guild := self.bot.get_guild(self.guild_id):
+            self.ensure_seeded(guild)
+            self.sample(time.time())
+
+    @sample_loop.before_loop
+    async def before_sample_loop(self):
+        await self.bot.wait_until_ready()
+
+    def is_tracked(self, member):
+        return self.seeded and member.guild.id == self.guild_id
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if guild := self.bot.get_guild(self.guild_id):
+            self.seed(guild)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if self.is_tracked(member):
+            self.add(member.roles, 1)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        if self.is_tracked(member):
+            self.add(member.roles, -1)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if not self.is_tracked(after) or before.roles == after.roles:
+            return
+
+        self.add(before.roles, -1)
+        self.add(after.roles, 1)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        # members lose the role without a member update, recount (from the cache) to keep members without role right
+        if self.seeded and role.guild.id == self.guild_id:
+            self.seed(role.guild)
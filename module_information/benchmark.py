@@ -0,0 +1,219 @@
+import argparse
+import glob
+import gzip
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup, SoupStrainer, UnicodeDammit
+from bs4.builder import builder_registry
+
+from module_information.parser import Parser
+
+"""
+  Offline-Benchmark für die Parser des Scrappers, ohne Netzwerkzugriff. Grundlage ist ein Verzeichnis mit Seiten
+  (index-*.html.gz für Studiengänge, module-*.html.gz für Modulseiten, auch ungepackt als .html).
+
+  Ohne --fixtures werden die synthetischen Seiten in module_information/fixtures/synthetic verwendet. Sie sind dem
+  Aufbau der Seiten der FernUniversität nachgebaut (Prüfungen, Mentorielle Betreuung, Downloads einzelner
+  Studiengänge), aber keine echten Seiten, Navigation und Texte sind Füllmaterial. Messwerte und Parität darauf
+  zeigen nur, wie sich die Parser zueinander verhalten. Aussagen über die echte Website brauchen echte, im Browser
+  gespeicherte Seiten, die mit --fixtures angegeben werden.
+
+  Für jedes installierte Backend von BeautifulSoup werden ausgegeben:
+    - Seiten pro Sekunde, Zeit pro Seite und maximaler Speicherbedarf (tracemalloc) je Parse-Modus,
+      und ob das Ergebnis mit dem vollständigen Parsen mit html.parser (wie im Scrapper) übereinstimmt
+    - die Zeit für den Aufbau des Baums und für jede einzelne parse_*-Methode pro Seite
+
+  python -m module_information.benchmark [--fixtures <verzeichnis>] [--rounds <anzahl>]
+
+  Mit --parity wird nur geprüft, ob das teilweise Parsen (Parser mit partial) für alle Seiten und Backends
+  dieselben Felder liefert wie das vollständige Parsen. Geprüft werden die Seiten selbst und Varianten davon, in
+  die Kommentare, Skripte und Styles mit irreführendem Markup eingefügt sind (PARITY_CASES). Abweichungen werden
+  ausgegeben, der Exit-Code ist dann 1. Vor dem Aktivieren von partial im Scrapper sollte das mit echten
+  gespeicherten Seiten (--fixtures) und nicht nur mit den synthetischen geprüft werden.
+"""
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "synthetic")
+BACKENDS = ["html.parser", "lxml", "html5lib"]
+REFERENCE_BACKEND = "html.parser"
+ROUNDS = 5
+FIELD_PARSERS = ["parse_title", "parse_infos", "parse_courses", "parse_support", "parse_exams", "parse_downloads",
+                 "parse_persons"]
+STRAINER = SoupStrainer(["title", "h2", "table", "div", "ul"])
+
+
+def full(parser, html):
+    return parser.parse_course_soup(BeautifulSoup(html, parser.features))
+
+
+def sections(parser, html):
+    """ Only parse the regions of the page the fields are read from (see Parser.parse_course_sections) """
+
+    return parser.parse_course_sections(html)
+
+
+def strainer(parser, html):
+    """ Only keep the elements the field parsers look at (and everything inside them) """
+
+    return parser.parse_course_soup(BeautifulSoup(html, parser.features, parse_only=STRAINER))
+
+
+MODES = {"full": full, "strainer": strainer, "sections": sections}
+
+PARITY_CASES = {
+    "original": lambda html: html,
+    "comment closing the courses div": lambda html: re.sub(
+        r"(Aktuelles Angebot\s*</h2>\s*<div\b[^>]*>)", r"\1<!-- </div> -->", html, count=1),
+    "script with a courses section": lambda html: re.sub(
+        r"(<body\b[^>]*>)", r'\1<script>document.write("<h2>Aktuelles Angebot</h2><div></div>");</script>', html,
+        count=1),
+    "comment with a download list": lambda html: re.sub(
+        r"(<body\b[^>]*>)", r'\1<!-- <h2>Download</h2><ul class="pdfliste"><li><a href="/x.pdf">x</a></li></ul> -->',
+        html, count=1),
+    "style with an exams table": lambda html: re.sub(
+        r"(</head\s*>)", r'<style>/* <table summary="Prüfungsinformationen"><th colspan="2"> */</style>\1', html,
+        count=1),
+    "comment in the title": lambda html: re.sub(r"(<title\b[^>]*>)", r"\1<!-- </title> -->", html, count=1),
+}
+
+
+def load_fixtures(directory):
+    """ Saved pages by kind ("index" or "module"), as bytes like the Scrapper gets them """
+
+    pages = {"index": [], "module": []}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html*"))):
+        kind = os.path.basename(path).split("-")[0]
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, mode='rb') as file:
+            pages.setdefault(kind, []).append(file.read())
+    return pages
+
+
+def describe(directory):
+    return "synthetic pages" if os.path.abspath(directory) == os.path.abspath(FIXTURES_DIR) else directory
+
+
+def available_backends():
+    return [backend for backend in BACKENDS if builder_registry.lookup(backend)]
+
+
+def per_call(function, items, rounds):
+    """ Mean time in seconds of one call of function per item """
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            function(item)
+    return (time.perf_counter() - start) / (rounds * len(items))
+
+
+def peak_memory(function, items):
+    """ Highest memory allocated while processing a single item, in bytes """
+
+    peak = 0
+    for item in items:
+        tracemalloc.start()
+        function(item)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return peak
+
+
+def benchmark_modes(parser, pages, reference, rounds):
+    results = {}
+    for name, mode in MODES.items():
+        seconds = per_call(lambda html: mode(parser, html), pages, rounds)
+        results[name] = {
+            "pages_per_second": 1 / seconds,
+            "ms_per_page": seconds * 1000,
+            "peak_kib": peak_memory(lambda html: mode(parser, html), pages) / 1024,
+            "identical": [mode(parser, html) for html in pages] == reference
+        }
+    return results
+
+
+def benchmark_fields(parser, pages, index_pages, rounds):
+    soups = [BeautifulSoup(html, parser.features) for html in pages]
+    timings = {"BeautifulSoup": per_call(lambda html: BeautifulSoup(html, parser.features), pages, rounds) * 1000}
+    for name in FIELD_PARSERS:
+        timings[name] = per_call(getattr(parser, name), soups, rounds) * 1000
+    if index_pages:
+        timings["parse_index_page"] = per_call(parser.parse_index_page, index_pages, rounds) * 1000
+    return timings
+
+
+def outcome(mode, parser, html):
+    """ Result of a parse mode, or the name of the exception it raised (the same error counts as parity) """
+
+    try:
+        return mode(parser, html)
+    except Exception as e:
+        return type(e).__name__
+
+
+def parity(directory=FIXTURES_DIR):
+    """ Compare partial and full parsing field by field, returns whether all pages are identical """
+
+    paths = sorted(glob.glob(os.path.join(directory, "module-*.html*")))
+    pages = [UnicodeDammit(html, is_html=True).unicode_markup for html in load_fixtures(directory)["module"]]
+    differences = 0
+    for backend in available_backends():
+        parser = Parser(features=backend)
+        for path, page in zip(paths, pages):
+            for case, change in PARITY_CASES.items():
+                html = change(page)
+                expected, result = outcome(full, parser, html), outcome(sections, parser, html)
+                if not isinstance(expected, dict) or not isinstance(result, dict):
+                    if result != expected:
+                        differences += 1
+                        print(f"{backend} {os.path.basename(path)} ({case}): {result} != {expected}")
+                    continue
+                for field in expected:
+                    if result.get(field) != expected[field]:
+                        differences += 1
+                        print(f"{backend} {os.path.basename(path)} ({case}) {field}: "
+                              f"{result.get(field)!r} != {expected[field]!r}")
+    print(f"{len(pages)} module pages ({describe(directory)}), {len(PARITY_CASES)} cases, {len(available_backends())} backends, "
+          f"{differences} differences")
+    return differences == 0
+
+
+def run(directory=FIXTURES_DIR, rounds=ROUNDS):
+    fixtures = load_fixtures(directory)
+    pages = fixtures["module"]
+    if not pages:
+        print(f"No module pages found in {directory}")
+        return
+
+    reference = [full(Parser(features=REFERENCE_BACKEND, partial=False), html) for html in pages]
+    size = sum(len(html) for html in pages) / len(pages) / 1024
+    print(f"{describe(directory)}: {len(pages)} module pages (average {size:.0f} KiB), "
+          f"{len(fixtures['index'])} index pages, {rounds} rounds")
+    missing = [backend for backend in BACKENDS if backend not in available_backends()]
+    if missing:
+        print(f"Not installed: {', '.join(missing)}")
+
+    for backend in available_backends():
+        parser = Parser(features=backend)
+        print(f"\n{backend}")
+        print(f"  {'mode':<14}{'pages/s':>10}{'ms/page':>10}{'peak KiB':>10}  identical")
+        for name, result in benchmark_modes(parser, pages, reference, rounds).items():
+            print(f"  {name:<14}{result['pages_per_second']:>10.1f}{result['ms_per_page']:>10.2f}"
+                  f"{result['peak_kib']:>10.0f}  {'yes' if result['identical'] else 'NO'}")
+        print(f"  {'step':<24}{'ms/page':>10}")
+        for name, milliseconds in benchmark_fields(parser, pages, fixtures["index"], rounds).items():
+            print(f"  {name:<24}{milliseconds:>10.3f}")
+
+
+if __name__ == "__main__":
+    arguments = argparse.ArgumentParser(description="Benchmark the module page parsers offline")
+    arguments.add_argument("--fixtures", default=FIXTURES_DIR, help="directory with pages, default: the synthetic pages")
+    arguments.add_argument("--rounds", type=int, default=ROUNDS, help="repetitions of every measurement")
+    arguments.add_argument("--parity", action="store_true", help="only compare partial and full parsing")
+    options = arguments.parse_args()
+    if options.parity:
+        sys.exit(0 if parity(options.fixtures) else 1)
+    run(options.fixtures, options.rounds)
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+
+import storage
+
+"""
+  Checkpoint eines Scrapper-Durchlaufs. Jedes geparste Ergebnis wird sofort als eine JSON-Zeile an die Datei
+  angehängt. Bricht ein Durchlauf ab (Fehler, Neustart des Bots), übernimmt der nächste Durchlauf die Ergebnisse
+  aus der Datei, statt die Seiten erneut abzurufen. Nach einem erfolgreichen Durchlauf wird die Datei gelöscht.
+"""
+
+MAX_AGE = 24 * 60 * 60
+
+
+class Checkpoint:
+    def __init__(self, path, max_age=MAX_AGE):
+        self.path = path
+        self.file = None
+        self.records = []
+        self.load(max_age)
+        if len(self.records) == 0:
+            self.append({"started": time.time()}, mode='w')
+
+    def load(self, max_age):
+        try:
+            with open(self.path, mode='r') as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return
+
+        try:
+            header = json.loads(lines[0])
+            if time.time() - header["started"] > max_age:
+                return
+        except (IndexError, KeyError, ValueError):
+            return
+
+        self.records.append(header)
+        for line in lines[1:]:
+            try:
+                self.records.append(json.loads(line))
+            except ValueError:
+                break  # last line was not completely written
+
+    def resumed(self, key):
+        """ Results of the interrupted run by the value of key ("page" or "index") """
+
+        return {record[key]: record['result'] for record in self.records if key in record}
+
+    def append(self, record, mode='a'):
+        """ Append a record in the storage thread, records are written in order """
+
+        return storage.submit(self.write, json.dumps(record), mode)
+
+    def write(self, line, mode):
+        if not self.file or mode == 'w':
+            self.file = open(self.path, mode=mode)
+        self.file.write(line + "\n")
+        self.file.flush()
+
+    def stop(self):
+        return storage.submit(self.close)
+
+    def remove(self):
+        return storage.submit(self.close, True)
+
+    def close(self, delete=False):
+        if self.file:
+            self.file.close()
+            self.file = None
+        if delete and os.path.exists(self.path):
+            os.remove(self.path)
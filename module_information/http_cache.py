@@ -0,0 +1,68 @@
+import hashlib
+import os
+import storage
+
+"""
+  HTTP-Cache für den Scrapper. Zu jeder URL werden ETag, Last-Modified und ein Hash des Inhalts in einer
+  Index-Datei gespeichert, der Inhalt selbst in einer eigenen Datei im Cache-Verzeichnis. Damit können Seiten
+  mit bedingten Anfragen (If-None-Match/If-Modified-Since) abgerufen werden und der Scrapper erkennt, welche Seiten
+  sich seit dem letzten Durchlauf tatsächlich geändert haben.
+"""
+
+
+class HttpCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_file = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+        self.index = storage.load(self.index_file, {})
+        self.uncommitted = {}
+
+    def save(self):
+        storage.save(self.index_file, self.index)
+
+    def body_file(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+    def headers(self, url):
+        """ Conditional request headers for url """
+
+        headers = {}
+        if entry := self.index.get(url):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, headers, body):
+        """ Store a fetched page. Returns True, if the content differs from the cached one.
+        The page only counts as cached after commit(url), so a page that could not be processed is fetched again. """
+
+        content_hash = hashlib.sha256(body).hexdigest()
+        entry = self.index.get(url)
+        changed = not entry or entry["hash"] != content_hash
+        if changed:
+            storage.write_later(self.body_file(url), body)
+        self.uncommitted[url] = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified"),
+                                 "hash": content_hash}
+        return changed
+
+    def commit(self, url):
+        if entry := self.uncommitted.pop(url, None):
+            self.index[url] = entry
+
+    def body(self, url):
+        """ Cached content of url, or None if it is not cached """
+
+        if url not in self.index:
+            return None
+        try:
+            with open(self.body_file(url), mode='rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def forget(self, url):
+        self.index.pop(url, None)
+        self.uncommitted.pop(url, None)
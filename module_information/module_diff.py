@@ -0,0 +1,80 @@
+import re
+
+"""
+  Vergleich der Moduldaten zweier Aktualisierungen. Welche Module sich geändert haben, wird allein über die Hashes
+  im Index bestimmt, sodass eine Aktualisierung ohne Änderungen keine Modulseite laden muss. Nur für geänderte
+  Module wird ein Vergleich der einzelnen Felder erstellt, dessen Länge begrenzt ist.
+"""
+
+MAX_LINES = 10
+MAX_VALUE_LENGTH = 80
+
+FIELDS = {
+    "title": "Titel",
+    "infos": "Modulinformationen",
+    "courses": "Kurse",
+    "support": "Mentoriate",
+    "exams": "Prüfungen",
+    "downloads": "Downloads",
+    "stg_downloads": "Downloads",
+    "persons": "Ansprechpersonen"
+}
+
+INFOS = {
+    "ects": "ECTS",
+    "time": "Arbeitsaufwand",
+    "duration": "Dauer des Moduls",
+    "interval": "Häufigkeit des Moduls",
+    "notes": "Anmerkung",
+    "requirements": "Inhaltliche Voraussetzungen"
+}
+
+
+def changed_urls(old_modules, new_modules):
+    """ Urls of modules, that were changed or added (by comparing the hashes of both LazyModules) """
+
+    return [url for url in new_modules if url not in old_modules or old_modules.hash(url) != new_modules.hash(url)]
+
+
+def shorten(value):
+    text = re.sub(r"\s+", " ", str(value)).strip()
+    return text if len(text) <= MAX_VALUE_LENGTH else text[:MAX_VALUE_LENGTH - 1] + "…"
+
+
+def label(field, item):
+    if field == "courses":
+        return f"{item['number']} {item['name']}"
+    if field == "exams":
+        return f"{item['name']}: {item['type']}, Gewichtung {item['weight']}, " \
+               f"Voraussetzungen {item['requirements']} / {item['hard_requirements']}"
+    if isinstance(item, dict):
+        return item.get('title', "")
+    return item
+
+
+def diff_field(field, old, new):
+    name = FIELDS[field]
+    if field == "infos":
+        old, new = old or {}, new or {}
+        return [f"{name} - {INFOS.get(key, key)}: {shorten(old.get(key))} → {shorten(new.get(key))}"
+                for key in INFOS if old.get(key) != new.get(key)]
+
+    if isinstance(old, list) or isinstance(new, list):
+        old, new = old or [], new or []
+        return [*[f"{name}: - {shorten(label(field, item))}" for item in old if item not in new],
+                *[f"{name}: + {shorten(label(field, item))}" for item in new if item not in old]]
+
+    return [f"{name}: {shorten(old)} → {shorten(new)}"]
+
+
+def diff_pages(old_page, new_page, max_lines=MAX_LINES):
+    """ Describe the changes between two versions of a module page, at most max_lines lines """
+
+    lines = []
+    for field in FIELDS:
+        if old_page.get(field) != new_page.get(field):
+            lines += diff_field(field, old_page.get(field), new_page.get(field))
+
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"… und {len(lines) - max_lines} weitere Änderungen"]
+    return lines
@@ -1,14 +1,25 @@
 import utils
 from help.help import help, help_category, handle_error
+from module_information.module_diff import changed_urls, diff_pages
+from module_information.module_store import ModuleStore, convert
 from module_information.scrapper import Scrapper
+from module_information.search_index import SearchIndex
 
-import json
+import asyncio
 import os
 import re
+import traceback
+from collections import OrderedDict
+
 import discord
 from discord.ext import commands, tasks
 
 
+EMBED_CACHE_SIZE = 512
+MAX_NOTIFIED_MODULES = 10
+QUERY_TITLE_LENGTH = 200
+
+
 class ModuleInformationNotFoundError(Exception):
     pass
 
@@ -24,7 +35,11 @@ class NoCourseOfStudyError(Exception):
 """
   Environment Variablen:
   DISCORD_MODULE_COURSE_FILE - Datei mit Studiengangsinformationen
-  DISCORD_MODULE_DATA_FILE - In dieser Datei werden die gescrappten Daten gespeichert
+  DISCORD_MODULE_DATA_FILE - Datei mit gescrappten Daten im alten Format, wird beim ersten Start umgewandelt
+  DISCORD_MODULE_DATA_DIR - (optional) In diesem Verzeichnis werden die gescrappten Daten gespeichert, Standard ist
+                            DISCORD_MODULE_DATA_FILE ohne Dateiendung (siehe module_store.py)
+  DISCORD_MODULE_CHANGES_CHANNEL - (optional) Kanal für Benachrichtigungen über geänderte Module. Ist er nicht gesetzt,
+                                   werden Änderungen in den Kanälen der Kurse des Moduls gepostet.
 """
 
 
@@ -33,10 +48,24 @@ class NoCourseOfStudyError(Exception):
 class ModuleInformation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.data = []
+        self.resolver = bot.get_cog("Resolver")
+        self.data = {"courses_of_studies": [], "modules": {}}
+        self.course_index = {}
+        self.stg_by_role = {}
+        self.modules_by_url = {}
+        self.embed_cache = OrderedDict()
+        self.embed_cache_stats = {"hits": 0, "misses": 0}
         self.roles_channel_id = int(os.getenv("DISCORD_ROLLEN_CHANNEL"))
+        self.guild_id = int(os.getenv("DISCORD_GUILD"))
+        self.mod_channel_id = int(os.getenv("DISCORD_MOD_CHANNEL"))
+        changes_channel_id = os.getenv("DISCORD_MODULE_CHANGES_CHANNEL")
+        self.changes_channel_id = int(changes_channel_id) if changes_channel_id else None
         self.data_file = os.getenv("DISCORD_MODULE_DATA_FILE")
         self.courses_file = os.getenv("DISCORD_MODULE_COURSE_FILE")
+        self.store = ModuleStore(os.getenv("DISCORD_MODULE_DATA_DIR") or os.path.splitext(self.data_file)[0])
+        self.search_index = SearchIndex(os.path.join(self.store.directory, "search.json"))
+        self.checkpoint_file = os.path.join(self.store.directory, "checkpoint.jsonl")
+        self.refresh_lock = asyncio.Lock()
         self.load_data()
         self.update_loop.start()
 
@@ -45,31 +74,123 @@ class ModuleInformation(commands.Cog):
         await self.refresh_data()
 
     async def refresh_data(self):
-        try:
-            scrapper = Scrapper(self.courses_file)
-            print("Refresh started")
-            data = await scrapper.scrap()
-            self.data = data
-            self.save_data()
-            print("Refresh finished")
-        except:
-            print("Can't refresh data")
-            pass
+        """ Scrap all module pages and replace the data. Pages that can't be scraped keep their previous data.
+        Returns the scrapper with its statistics on success. """
+
+        async with self.refresh_lock:
+            try:
+                scrapper = Scrapper(self.courses_file, previous=self.data, checkpoint_file=self.checkpoint_file)
+                print("Refresh started")
+                data = await scrapper.scrap()
+                await self.bot.loop.run_in_executor(None, self.store.write, data)
+                scrapper.checkpoint.remove()
+                data = self.store.load()
+                changes = self.module_changes(self.data['modules'], data['modules'])
+                self.set_data(data)
+                await self.bot.loop.run_in_executor(None, self.store.cleanup)
+                await self.notify_changes(changes)
+                print(f"Refresh finished in {scrapper.stats['duration']:.1f}s "
+                      f"({scrapper.stats['requests']} requests, {scrapper.stats['not_modified']} not modified, "
+                      f"{scrapper.stats['retries']} retries, {scrapper.stats['bytes'] // 1024} KiB, "
+                      f"{scrapper.stats['parsed']} pages parsed, {scrapper.stats['reused']} reused, "
+                      f"{scrapper.stats['resumed']} resumed, {scrapper.stats['failed']} failed, "
+                      f"event loop blocked {scrapper.stats['loop_blocked']:.2f}s, "
+                      f"max. {scrapper.stats['loop_max_lag'] * 1000:.0f}ms at once)")
+                return scrapper
+            except Exception:
+                print("Can't refresh data")
+                traceback.print_exc()
+                return None
+
+    def module_changes(self, old_modules, new_modules):
+        """ Field level changes of all modules, whose hash changed. New modules are not reported. """
+
+        changes = []
+        for url in changed_urls(old_modules, new_modules):
+            if url not in old_modules or 'stg_downloads' not in (old_page := old_modules[url]):
+                continue  # no comparable previous version
+            if lines := diff_pages(old_page, new_modules[url]):
+                changes.append((url, lines))
+        return changes
+
+    async def course_channels(self):
+        """ Text channels of the guild by the course number in their name """
+
+        guild = await self.resolver.guild(self.guild_id)
+        channels = {}
+        for channel in guild.text_channels:
+            if match := re.search(r"^([0-9]+)-", channel.name):
+                channels.setdefault(match[1].lstrip('0'), []).append(channel)
+        return channels
+
+    async def notify_changes(self, changes):
+        if len(changes) == 0:
+            return
+
+        if len(changes) > MAX_NOTIFIED_MODULES:
+            channel = await self.resolver.channel(self.changes_channel_id or self.mod_channel_id)
+            titles = ", ".join(self.modules_by_url[url]['title'] for url, _ in changes[:20])
+            await channel.send(f"Bei der Aktualisierung haben sich {len(changes)} Module geändert, zu viele für "
+                               f"einzelne Benachrichtigungen: {titles}"[:2000])
+            return
+
+        course_channels = None if self.changes_channel_id else await self.course_channels()
+        for url, lines in changes:
+            text = f"**Änderungen an Modul {self.modules_by_url[url]['title']}**\n" + "\n".join(lines)
+            if course_channels is None:
+                channels = [await self.resolver.channel(self.changes_channel_id)]
+            else:
+                channels = [channel for number in self.data['modules'].courses(url)
+                            for channel in course_channels.get(number.lstrip('0'), [])]
+                if len(channels) == 0:
+                    channels = [await self.resolver.channel(self.mod_channel_id)]
+
+            for channel in channels:
+                try:
+                    await channel.send(text[:2000])
+                except discord.errors.HTTPException as e:
+                    print(f"Can't post module changes to {channel}: {e}")
 
     @update_loop.before_loop
     async def before_update_loop(self):
         await self.bot.wait_until_ready()
 
-    def save_data(self):
-        data_file = open(self.data_file, mode='w')
-        json.dump(self.data, data_file)
-
     def load_data(self):
-        try:
-            data_file = open(self.data_file, mode='r')
-            self.data = json.load(data_file)
-        except FileNotFoundError:
-            self.data = {}
+        if not self.store.exists():
+            if os.path.exists(self.data_file):
+                convert(self.data_file, self.store.directory)
+            else:
+                self.store.write({"courses_of_studies": [], "modules": {}})
+        self.set_data(self.store.load())
+
+    def set_data(self, data):
+        """ Replace the data together with the lookup indexes built from it """
+
+        course_index = {}
+        stg_by_role = {}
+        modules_by_url = {}
+        for position, course_of_studies in enumerate(data['courses_of_studies']):
+            if 'role' in course_of_studies:
+                stg_by_role.setdefault(course_of_studies['role'], (position, course_of_studies['short']))
+            for module in course_of_studies.get('modules', []):
+                entry = modules_by_url.setdefault(module['url'], {"title": module['title'], "shorts": []})
+                entry['shorts'].append(course_of_studies['short'])
+                for number in data['modules'].courses(module['url']):
+                    entries = course_index.setdefault(number.lstrip('0'), [])
+                    entries.append((course_of_studies, module))
+
+        self.search_index.update(data['modules'])
+        self.data, self.course_index, self.stg_by_role = data, course_index, stg_by_role
+        self.modules_by_url = modules_by_url
+        self.embed_cache.clear()
+
+    def module_view(self, module):
+        """ Module of a degree program with its page, including the downloads of the degree program """
+
+        page = self.data['modules'][module['url']]
+        downloads = [*(page.get('downloads') or []), *module.get('downloads', [])]
+        return {"title": module['title'], "number": module['number'], "url": module['url'],
+                "page": {**page, "downloads": downloads if len(downloads) > 0 else None}}
 
     def number_of_channel(self, channel):
         try:
@@ -91,7 +212,7 @@ class ModuleInformation(commands.Cog):
             await subcommand(ctx, module)
         except NoCourseOfStudyError:
             shorts = []
-            for course_of_studies in self.data:
+            for course_of_studies in self.data['courses_of_studies']:
                 shorts.append(f"`{course_of_studies['short']}`")
             await ctx.channel.send(
                 f"Fehler! Wähle entweder eine Studiengangs-Rolle aus oder gebe ein Studiengangskürzel"
@@ -115,22 +236,9 @@ class ModuleInformation(commands.Cog):
         return stg
 
     async def get_valid_modules_for_course_number(self, number):
-        valid_modules = []
-        try:
-            for course_of_studies in self.data:
-                for module in course_of_studies['modules']:
-                    for course in module['page']['courses']:
-                        cn = re.sub(r'^0+', '', course['number'])
-                        n = re.sub(r'^0+', '', number)
-                        if n == cn:
-                            valid_modules.append({
-                                "stg": course_of_studies['name'],
-                                "short": course_of_studies['short'],
-                                "data": module
-                            })
-            return valid_modules
-        except:
-            return []
+        return [{"stg": course_of_studies['name'], "short": course_of_studies['short'],
+                 "data": self.module_view(module)}
+                for course_of_studies, module in self.course_index.get(number.lstrip('0'), [])]
 
     async def find_module(self, ctx, arg_stg):
         short = await self.get_stg_short(ctx, arg_stg)
@@ -149,17 +257,31 @@ class ModuleInformation(commands.Cog):
         return module
 
     async def get_stg_short_from_role(self, user):
-        try:
-            for course_of_studies in self.data:
-                if 'role' in course_of_studies:
-                    for r in user.roles:
-                        if str(r.id) == course_of_studies['role']:
-                            return course_of_studies['short']
-            return None
-        except discord.ext.commands.errors.CommandInvokeError:
-            return None
+        """ Short of the first degree program (in order of the courses file), the user has the role for """
+
+        stgs = [stg for role in user.roles if (stg := self.stg_by_role.get(str(role.id)))]
+        return min(stgs)[1] if len(stgs) > 0 else None
+
+    async def send_embed(self, ctx, module, subcommand, render, *args):
+        """ Send the embed rendered by render(module, *args). Rendered embeds are cached by module, subcommand,
+        degree program and notfound flag until the data is refreshed. """
+
+        key = (module['data']['url'], subcommand, module['short'], 'notfound' in module)
+        if embed := self.embed_cache.get(key):
+            self.embed_cache.move_to_end(key)
+            self.embed_cache_stats["hits"] += 1
+        else:
+            embed = render(module, *args)
+            self.embed_cache_stats["misses"] += 1
+            self.embed_cache[key] = embed
+            if len(self.embed_cache) > EMBED_CACHE_SIZE:
+                self.embed_cache.popitem(last=False)
+        await ctx.channel.send(embed=embed)
 
     async def download_for(self, ctx, title, module):
+        await self.send_embed(ctx, module, f"download:{title}", self.render_download, title)
+
+    def render_download(self, module, title):
         try:
             data = module['data']['page']['downloads']
             if not data:
@@ -180,21 +302,9 @@ class ModuleInformation(commands.Cog):
         embed = discord.Embed(title=title,
                               description=desc,
                               color=19607)
-        await ctx.channel.send(embed=embed)
+        return embed
 
-    async def handbook(self, ctx, module):
-        try:
-            await self.download_for(ctx, "Modulhandbuch", module)
-        except ModuleInformationNotFoundError:
-            raise ModuleInformationNotFoundError("Leider habe ich kein Modulhandbuch gefunden.")
-
-    async def reading_sample(self, ctx, module):
-        try:
-            await self.download_for(ctx, "Leseprobe", module)
-        except ModuleInformationNotFoundError:
-            raise ModuleInformationNotFoundError("Leider habe ich keine Leseprobe gefunden.")
-
-    async def info(self, ctx, module):
+    def render_info(self, module):
         try:
             data = module['data']
             info = data['page']['infos']
@@ -227,9 +337,9 @@ class ModuleInformation(commands.Cog):
         embed = discord.Embed(title=f"Modul {data['title']}",
                               description=desc,
                               color=19607)
-        await ctx.channel.send(embed=embed)
+        return embed
 
-    async def load(self, ctx, module):
+    def render_load(self, module):
         try:
             data = module['data']['page']['infos']['time']
             if not data:
@@ -243,9 +353,9 @@ class ModuleInformation(commands.Cog):
         embed = discord.Embed(title=f"Arbeitsaufwand",
                               description=desc,
                               color=19607)
-        await ctx.channel.send(embed=embed)
+        return embed
 
-    async def support(self, ctx, module):
+    def render_support(self, module):
         try:
             data = module['data']['page']['support']
             if not data:
@@ -260,9 +370,9 @@ class ModuleInformation(commands.Cog):
         embed = discord.Embed(title=f"Mentoriate ",
                               description=desc,
                               color=19607)
-        await ctx.channel.send(embed=embed)
+        return embed
 
-    async def exams(self, ctx, module):
+    def render_exams(self, module):
         try:
             data = module['data']['page']['exams']
             if not data:
@@ -288,7 +398,31 @@ class ModuleInformation(commands.Cog):
         embed = discord.Embed(title=f"Prüfungsinformationen",
                               description=desc,
                               color=19607)
-        await ctx.channel.send(embed=embed)
+        return embed
+
+    async def handbook(self, ctx, module):
+        try:
+            await self.download_for(ctx, "Modulhandbuch", module)
+        except ModuleInformationNotFoundError:
+            raise ModuleInformationNotFoundError("Leider habe ich kein Modulhandbuch gefunden.")
+
+    async def reading_sample(self, ctx, module):
+        try:
+            await self.download_for(ctx, "Leseprobe", module)
+        except ModuleInformationNotFoundError:
+            raise ModuleInformationNotFoundError("Leider habe ich keine Leseprobe gefunden.")
+
+    async def info(self, ctx, module):
+        await self.send_embed(ctx, module, "info", self.render_info)
+
+    async def load(self, ctx, module):
+        await self.send_embed(ctx, module, "load", self.render_load)
+
+    async def support(self, ctx, module):
+        await self.send_embed(ctx, module, "support", self.render_support)
+
+    async def exams(self, ctx, module):
+        await self.send_embed(ctx, module, "exams", self.render_exams)
 
     @help(
         category="moduleinformation",
@@ -317,8 +451,65 @@ class ModuleInformation(commands.Cog):
     @cmd_module.command("update")
     @commands.check(utils.is_mod)
     async def cmd_module_update(self, ctx):
+        if self.refresh_lock.locked():
+            await ctx.channel.send("Die Daten werden gerade aktualisiert.")
+            return
+
         await ctx.channel.send("Refreshing...")
-        await self.refresh_data()
+        if scrapper := await self.refresh_data():
+            await ctx.channel.send(f"Aktualisierung abgeschlossen: {scrapper.stats['requests']} Seiten "
+                                   f"({scrapper.stats['parsed']} geändert) "
+                                   f"in {scrapper.stats['duration']:.1f} Sekunden. Der Bot war dabei "
+                                   f"{scrapper.stats['loop_blocked']:.2f} Sekunden blockiert.")
+            if len(scrapper.failures) > 0:
+                failed = "\n".join(url for url, _ in scrapper.failures[:10])
+                await ctx.channel.send(f"{len(scrapper.failures)} Seiten konnten nicht abgerufen werden, "
+                                       f"für diese werden die bisherigen Daten verwendet:\n{failed}"[:2000])
+        else:
+            await ctx.channel.send("Fehler! Die Daten konnten nicht aktualisiert werden.")
+
+    @help(
+        command_group="module",
+        category="moduleinformation",
+        syntax="!module cache",
+        mod=True,
+        brief="Zeigt an, wie oft Antworten aus dem Cache beantwortet werden konnten. "
+    )
+    @cmd_module.command("cache")
+    @commands.check(utils.is_mod)
+    async def cmd_module_cache(self, ctx):
+        hits = self.embed_cache_stats["hits"]
+        total = hits + self.embed_cache_stats["misses"]
+        rate = hits / total * 100 if total > 0 else 0
+        await ctx.send(f"Cache-Treffer: {hits} von {total} ({rate:.1f}%)\n"
+                       f"Einträge im Cache: {len(self.embed_cache)}/{EMBED_CACHE_SIZE}")
+
+    @help(
+        command_group="module",
+        category="moduleinformation",
+        syntax="!module search <begriffe>",
+        parameters={
+            "begriffe": "Suchbegriffe, z. B. Modulnummer, Titel, Kursname, Ansprechperson oder Prüfungsart"
+        },
+        brief="Sucht nach Modulen. Funktioniert auch außerhalb der Kurs-Kanäle. "
+    )
+    @cmd_module.command("search", aliases=["suche", "suchen"])
+    async def cmd_module_search(self, ctx, *, query):
+        urls = self.search_index.search(query)
+        if len(urls) == 0:
+            await ctx.channel.send("Leider habe ich keine passenden Module gefunden.")
+            return
+
+        desc = ""
+        for url in urls:
+            if module := self.modules_by_url.get(url):
+                desc += f"[{module['title']}]({url}) ({', '.join(module['shorts'])})\n"
+        if len(query) > QUERY_TITLE_LENGTH:  # embed titles are limited to 256 characters
+            query = query[:QUERY_TITLE_LENGTH] + "…"
+        embed = discord.Embed(title=f"Suchergebnisse für \"{query}\"",
+                              description=desc,
+                              color=19607)
+        await ctx.channel.send(embed=embed)
 
     @help(
         command_group="module",
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sys
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import storage
+
+"""
+  Kompaktes Speicherformat für die gescrappten Moduldaten.
+
+  Das Verzeichnis enthält eine kleine index.json mit den Studiengängen, deren Modulen und für jede Modulseite
+  Hash, Dateiname, Kursnummern und ob sie die Downloads der Studiengänge enthält. Die Modulseiten selbst liegen einzeln und kompakt im Unterverzeichnis modules,
+  benannt nach dem Hash ihres Inhalts. Beim Start wird nur der Index geladen, Modulseiten erst beim ersten Zugriff
+  (mit LRU-Cache). Da sich der Dateiname mit dem Inhalt ändert, werden bestehende Dateien nie überschrieben und
+  nur geänderte Seiten geschrieben.
+
+  Eine Datei im bisherigen JSON-Format wird beim ersten Start automatisch umgewandelt, oder manuell mit
+  `python -m module_information.module_store <json-datei> <verzeichnis>`.
+"""
+
+CACHE_SIZE = 128
+
+
+def serialize(page):
+    return json.dumps(page, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+
+
+def convert_legacy_data(courses_of_studies):
+    """ Convert data of the old format, that contained a complete copy of the module page for every degree program.
+    Downloads contained in all copies become the common downloads, the others stay with the degree program. """
+
+    modules = {}
+    for course_of_studies in courses_of_studies:
+        for module in course_of_studies.get('modules', []):
+            page = module.pop('page')
+            module['downloads'] = page.get('downloads') or []
+            if module['url'] not in modules:
+                modules[module['url']] = page
+                page['downloads'] = module['downloads']
+            else:
+                common = modules[module['url']]['downloads']
+                modules[module['url']]['downloads'] = [download for download in common
+                                                       if download in module['downloads']]
+
+    for course_of_studies in courses_of_studies:
+        for module in course_of_studies.get('modules', []):
+            common = modules[module['url']]['downloads']
+            module['downloads'] = [download for download in module['downloads'] if download not in common]
+
+    return {"courses_of_studies": courses_of_studies, "modules": modules}
+
+
+class LazyModules(Mapping):
+    """ Read only mapping url -> module page, that loads the pages from their files on first access """
+
+    def __init__(self, directory, index, cache_size=CACHE_SIZE):
+        self.directory = directory
+        self.index = index
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def __getitem__(self, url):
+        if url in self.cache:
+            self.cache.move_to_end(url)
+            return self.cache[url]
+
+        page = self.read(url)
+        self.cache[url] = page
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return page
+
+    def read(self, url):
+        """ Load a page from its file without the cache, can also be called from other threads """
+
+        with open(os.path.join(self.directory, self.index[url]['file']), mode='r') as file:
+            return json.load(file)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def courses(self, url):
+        """ Course numbers of a module, without loading its page """
+
+        return self.index[url]['courses']
+
+    def hash(self, url):
+        return self.index[url]['hash']
+
+    def has_stg_downloads(self, url):
+        """ Whether the page contains the downloads of the degree programs (not for pages of the old format) """
+
+        return self.index[url].get('stg_downloads', False)
+
+
+class ModuleStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.modules_directory = os.path.join(directory, "modules")
+        self.index_file = os.path.join(directory, "index.json")
+
+    def exists(self):
+        return os.path.exists(self.index_file)
+
+    def load(self):
+        """ Load the index. Module pages are loaded on access. """
+
+        index = storage.load(self.index_file)
+        return {"courses_of_studies": index['courses_of_studies'],
+                "modules": LazyModules(self.modules_directory, index['modules'])}
+
+    def write(self, data):
+        """ Write data (with modules as mapping url -> page). Only pages that are not stored yet are written. """
+
+        os.makedirs(self.modules_directory, exist_ok=True)
+        modules = data['modules']
+        index = {}
+        for url in modules:
+            if isinstance(modules, LazyModules):
+                entry = modules.index[url]
+            else:
+                page = modules[url]
+                text = serialize(page)
+                content_hash = hashlib.sha1(text.encode()).hexdigest()
+                entry = {"file": f"{content_hash}.json", "hash": content_hash,
+                         "courses": [course['number'] for course in page.get('courses') or []],
+                         "stg_downloads": 'stg_downloads' in page}
+                if not os.path.exists(os.path.join(self.modules_directory, entry['file'])):
+                    storage.write_atomic(os.path.join(self.modules_directory, entry['file']), text)
+            index[url] = entry
+
+        storage.write_atomic(self.index_file, json.dumps({"courses_of_studies": data['courses_of_studies'],
+                                                          "modules": index}))
+
+    def cleanup(self):
+        """ Remove module files, that are no longer referenced by the index """
+
+        referenced = {entry['file'] for entry in storage.load(self.index_file)['modules'].values()}
+        for filename in os.listdir(self.modules_directory):
+            if filename not in referenced:
+                os.remove(os.path.join(self.modules_directory, filename))
+
+
+def convert(json_file, directory):
+    data = storage.load(json_file)
+    if isinstance(data, list):
+        data = convert_legacy_data(data)
+    store = ModuleStore(directory)
+    store.write(data)
+    store.cleanup()
+    return store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python -m module_information.module_store <json file> <directory>")
+        sys.exit(1)
+
+    convert(sys.argv[1], sys.argv[2])
+    print("Conversion finished")
@@ -0,0 +1,291 @@
+from bs4 import BeautifulSoup, UnicodeDammit
+import html as entities
+import re
+
+"""
+  Parser für die Seiten der FernUniversität. Die Klasse hat keinen Zustand außer der Basis-URL, damit sie in einen
+  anderen Prozess übertragen und dort ausgeführt werden kann. Ergebnisse sind einfache dicts und Listen.
+  features wählt den Parser von BeautifulSoup (html.parser, lxml oder html5lib, falls installiert).
+
+  Mit partial (optional, Standard ist aus) wird nicht die ganze Modulseite in einen Baum geparst, sondern nur die
+  Bereiche, aus denen die Felder gelesen werden (Titel, die Tabellen Modul- und Prüfungsinformationen, die Abschnitte
+  unter den h2-Überschriften bis zum Ende des gelesenen Elements). Die Bereiche werden im Markup gesucht, wobei
+  Kommentare und der Inhalt von script- und style-Elementen übersprungen werden, und erst beim Zugriff einzeln
+  geparst. Kann ein Feld nicht aus seinem Bereich gelesen werden, wird dafür doch die ganze Seite geparst. Ob das
+  Ergebnis dasselbe ist wie beim vollständigen Parsen, prüft `python -m module_information.benchmark --parity`.
+  Im Scrapper wird partial mit DISCORD_MODULE_PARSER_PARTIAL eingeschaltet.
+"""
+
+HIDDEN = re.compile(r"<!--.*?(?:-->|$)|<(script|style)\b[^>]*>.*?(?:</\1\s*>|$)", re.I | re.S)
+TAG = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)")
+TITLE = re.compile(r"<title\b", re.I)
+H2 = re.compile(r"<h2\b[^>]*>(.*?)</h2\s*>", re.I | re.S)
+SUMMARY = re.compile(r"<[a-zA-Z][^>]*\bsummary\s*=\s*([\"'])(.*?)\1", re.I | re.S)
+TH_COLSPAN = re.compile(r"<th\b[^>]*\bcolspan", re.I)
+DIV = re.compile(r"<div\b", re.I)
+UL = re.compile(r"<ul\b", re.I)
+PDF_LIST = re.compile(r"<ul\b[^>]*\bclass\s*=\s*([\"'])[^\"']*(?<![\w-])pdfliste(?![\w-])", re.I)
+
+
+def hide(match):
+    return " " * len(match[0])
+
+
+def element_end(html, start):
+    """ Position after the end tag of the element starting at start, respecting nested elements of the same name """
+
+    name = TAG.match(html, start)[1]
+    depth = 0
+    for tag in re.compile(rf"<(/?){name}\b[^>]*>", re.I).finditer(html, start):
+        depth += -1 if tag[1] else 1
+        if depth == 0:
+            return tag.end()
+    return len(html)
+
+
+class Sections:
+    """ Regions of a module page. Every region is parsed into its own small tree on first access. """
+
+    def __init__(self, html, features):
+        if isinstance(html, bytes):
+            html = UnicodeDammit(html, is_html=True).unicode_markup
+        self.html = html
+        # same positions as html, but comments, scripts and styles are blanked, so tags in them are not found
+        self.markup = HIDDEN.sub(hide, html)
+        self.features = features
+        self.soups = {}
+
+    def soup(self, start, end):
+        if (start, end) not in self.soups:
+            self.soups[(start, end)] = BeautifulSoup(self.html[start:end], self.features)
+        return self.soups[(start, end)]
+
+    def document(self):
+        return self.soup(0, len(self.html))
+
+    def empty(self):
+        return self.soup(0, 0)
+
+    def parse(self, function, region):
+        """ Apply a parse_* function to a region, or to the whole page if that fails """
+
+        try:
+            return function(region())
+        except Exception:
+            return function(self.document())
+
+    def title(self):
+        if not (match := TITLE.search(self.markup)):
+            return self.empty()
+        return self.soup(match.start(), element_end(self.markup, match.start()))
+
+    def table(self, summary, continued=None):
+        """ The element with the given summary. With continued, the whole page is used if the pattern also occurs
+        after the element, because the parse function may continue searching there. """
+
+        for match in SUMMARY.finditer(self.markup):
+            if entities.unescape(match[2]) == summary:
+                end = element_end(self.markup, match.start())
+                if continued and continued.search(self.markup, end):
+                    return self.document()
+                return self.soup(match.start(), end)
+        return self.empty()
+
+    def section(self, heading, following):
+        """ From the first h2 with a text matching heading to the end of the next element matching following """
+
+        for match in H2.finditer(self.markup):
+            text = self.html[match.start(1):match.end(1)]
+            if '<' in text:
+                text = BeautifulSoup(self.html[match.start():match.end()], self.features).h2.string
+            else:
+                text = entities.unescape(text) or None
+            if text is not None and re.search(heading, text):
+                if not (element := following.search(self.markup, match.start() + 1)):
+                    return self.soup(match.start(), len(self.html))
+                return self.soup(match.start(), element_end(self.markup, element.start()))
+        return self.empty()
+
+
+class Parser:
+    def __init__(self, base_url='https://www.fernuni-hagen.de', features="html.parser", partial=False):
+        self.base_url = base_url
+        self.features = features
+        self.partial = partial
+
+    def prepare_url(self, url):
+        if re.search(r"^http(s)*://", url):
+            return url
+        elif re.search(r"^/", url):
+            return self.base_url + url
+        return self.base_url + "/" + url
+
+    def parse_index_page(self, html):
+        soup = BeautifulSoup(html, self.features)
+        modules_source = soup.findAll('a', text=re.compile(r'^[0-9]{5} '))
+        modules = []
+        for item in modules_source:
+            module = {
+                "title": item.get_text(),
+                "number": re.sub('^0+', '', re.search('^([0-9]+) ', item.get_text())[1]),
+                "url": self.prepare_url(item['href'])
+            }
+            modules.append(module)
+        return modules
+
+    def parse_course_page(self, html):
+        """ Parse a module page. The result is the same for all degree programs, the downloads specific to a
+        degree program are returned separately in stg_downloads (see downloads_for_stg). """
+
+        if self.partial:
+            return self.parse_course_sections(html)
+        return self.parse_course_soup(BeautifulSoup(html, self.features))
+
+    def parse_course_sections(self, html):
+        page = Sections(html, self.features)
+        downloads, stg_downloads = page.parse(self.parse_downloads, lambda: page.section(r'Download', PDF_LIST))
+        module = {
+            "title": page.parse(self.parse_title, page.title),
+            "infos": page.parse(self.parse_infos, lambda: page.table('Modulinformationen')),
+            "courses": page.parse(self.parse_courses, lambda: page.section(r'Aktuelles Angebot', DIV)),
+            "support": page.parse(self.parse_support, lambda: page.section(
+                r'Mentorielle Betreuung in Regional- und Studienzentren', DIV)),
+            "exams": page.parse(self.parse_exams, lambda: page.table('Prüfungsinformationen', TH_COLSPAN)),
+            "downloads": downloads,
+            "stg_downloads": stg_downloads,
+            "persons": page.parse(self.parse_persons, lambda: page.section(r'Ansprechpersonen', UL))
+        }
+        return module
+
+    def parse_course_soup(self, soup):
+        downloads, stg_downloads = self.parse_downloads(soup)
+        module = {
+            "title": self.parse_title(soup),
+            "infos": self.parse_infos(soup),
+            "courses": self.parse_courses(soup),
+            "support": self.parse_support(soup),
+            "exams": self.parse_exams(soup),
+            "downloads": downloads,
+            "stg_downloads": stg_downloads,
+            "persons": self.parse_persons(soup)
+        }
+        return module
+
+    def parse_title(self, soup):
+        title = re.sub(
+            r" -.*FernUniversität in Hagen",
+            "",
+            soup.title.string,
+            flags=re.S
+        ).strip()
+        return title
+
+    def parse_infos(self, soup):
+        try:
+            info_source = soup.find(summary='Modulinformationen')
+        except:
+            return None
+        infos = {
+            "ects": info_source.find('th', text='ECTS').findNext('td').get_text(),
+            "time": info_source.find('th', text='Arbeitsaufwand').findNext('td').get_text(),
+            "duration": info_source.find('th', text='Dauer des Moduls').findNext('td').get_text(),
+            "interval": info_source.find('th', text='Häufigkeit des Moduls').findNext('td').get_text(),
+            "notes": info_source.find('th', text='Anmerkung').findNext('td').get_text(),
+            "requirements": info_source.find('th', text='Inhaltliche Voraussetzung').findNext('td').get_text()
+        }
+        return infos
+
+    def parse_courses(self, soup):
+        try:
+            course_source = soup.find('h2', text=re.compile(r'Aktuelles Angebot')) \
+                .findNext('div') \
+                .findAll('a')
+        except:
+            return None
+        courses = []
+        for link in course_source:
+            course = {
+                "name": re.sub('^Kurs [0-9]+ ', '', link.get_text()),
+                "number": re.sub('^0+', '', re.search('([^/]+)$', link['href'])[1]),
+                "url": self.prepare_url(link['href'])
+            }
+            courses.append(course)
+        return courses
+
+    def parse_support(self, soup):
+        try:
+            support_source = soup.find('h2', text=re.compile(
+                r'Mentorielle Betreuung in Regional- und Studienzentren')).findNext('div').findAll('li')
+        except:
+            return None
+
+        supports = None
+        if support_source:
+            supports = []
+            for item in support_source:
+                support = {
+                    "title": item.get_text(),
+                    "city": item.find('a').get_text(),
+                    "url": self.prepare_url(item.find('a')['href'])
+                }
+                supports.append(support)
+        return supports
+
+    def parse_exams(self, soup):
+        try:
+            exam_source = soup.find(summary='Prüfungsinformationen')
+        except:
+            return None
+        stg = exam_source.findNext('th', colspan='2')
+        exams = []
+        while stg != None:
+            exam = {
+                "name": stg.get_text(),
+                "type": stg.findNext('th', text='Art der Prüfungsleistung').findNext('td').get_text(),
+                "requirements": stg.findNext('th', text='Voraussetzung').findNext('td').get_text(),
+                "weight": stg.findNext('th', text='Stellenwert der Note').findNext('td').get_text(),
+                "hard_requirements": stg.findNext('th', text='Formale Voraussetzungen').findNext('td').get_text()
+            }
+            exams.append(exam)
+            stg = stg.findNext('th', colspan='2')
+        return exams
+
+    def parse_downloads(self, soup):
+        try:
+            download_source = soup.find('h2', text=re.compile(r'Download')) \
+                .findNext('ul', attrs={'class': 'pdfliste'}) \
+                .findAll('li')
+        except:
+            return None, []
+
+        downloads = []
+        stg_downloads = []
+        for item in download_source:
+            download = {
+                "title": item.find('a').get_text(),
+                "url": self.prepare_url(item.find('a')['href'])
+            }
+            if item.get('class'):
+                download['stg'] = ' '.join(item['class'])
+                stg_downloads.append(download)
+            else:
+                downloads.append(download)
+        return downloads, stg_downloads
+
+    def parse_persons(self, soup):
+        try:
+            person_source = soup.find('h2', text=re.compile(
+                r'Ansprechpersonen')).findNext('ul').findAll('h4')
+        except:
+            return None
+        persons = []
+        for item in person_source:
+            persons.append(item.get_text())
+        return persons
+
+
+def downloads_for_stg(stg_downloads, short):
+    """ The degree program specific downloads for the degree program with the given short """
+
+    return [{"title": download['title'], "url": download['url']}
+            for download in stg_downloads if re.search(short, download['stg'])]
@@ -1,185 +1,276 @@
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
 import aiohttp
-import re
+import asyncio
 import os
-import json
+import time
+import storage
+import traceback
+from module_information.checkpoint import Checkpoint
+from module_information.http_cache import HttpCache
+from module_information.module_store import LazyModules
+from module_information.parser import Parser, downloads_for_stg
+
+"""
+  Ergebnis von scrap() sind die Studiengänge aus DISCORD_MODULE_COURSE_FILE mit ihren Modulen und die Modulseiten.
+  Jede Modulseite wird nur einmal abgerufen und geparst, auch wenn das Modul zu mehreren Studiengängen gehört:
+    {"courses_of_studies": [{..., "modules": [{"title", "number", "url", "downloads"}]}], "modules": {url: page}}
+  Die Module eines Studiengangs verweisen über ihre URL auf die gemeinsame Seite, "downloads" enthält nur die
+  zusätzlichen Downloads des Studiengangs.
+
+  Fehlgeschlagene Anfragen werden mit steigender Wartezeit wiederholt. Kann eine Seite trotzdem nicht abgerufen oder
+  geparst werden, werden die Daten des vorherigen Durchlaufs für diese Seite weiter verwendet. Mit checkpoint_file
+  werden Ergebnisse laufend gespeichert, sodass ein abgebrochener Durchlauf fortgesetzt werden kann.
+
+  DISCORD_MODULE_SCRAPPER_CONCURRENCY - (optional) Maximale Anzahl gleichzeitiger Anfragen pro Host (Standard 4)
+  DISCORD_MODULE_PARSER_PROCESSES - (optional) Anzahl der Prozesse, in denen die Seiten geparst werden (Standard 2).
+                                    Bei 0 wird wie früher direkt im Event-Loop geparst.
+  DISCORD_MODULE_PARSER_PARTIAL - (optional) Bei 1 werden von den Modulseiten nur die Bereiche geparst, aus denen
+                                  die Felder gelesen werden (siehe Parser), Standard ist 0. Vorher mit
+                                  `python -m module_information.benchmark --parity --fixtures <verzeichnis>` auf
+                                  echten gespeicherten Seiten prüfen, dass das Ergebnis gleich bleibt.
+  DISCORD_MODULE_CACHE_DIR - (optional) Verzeichnis für den HTTP-Cache. Ist es gesetzt, werden Seiten mit bedingten
+                             Anfragen abgerufen und nur geänderte Modulseiten neu geparst.
+"""
+
+RETRIES = 3
+BACKOFF = 1.0
+
+
+class LoopMonitor:
+    """ Measures how long the event loop is blocked, by checking how late a periodic sleep wakes up """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.max_lag = 0
+        self.blocked = 0
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+
+    def stop(self):
+        self.task.cancel()
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.interval:
+                self.blocked += lag
 
 
 class Scrapper:
-    def __init__(self, filename):
-        self.base_url = 'https://www.fernuni-hagen.de'
+    def __init__(self, filename, concurrency=None, processes=None, base_url='https://www.fernuni-hagen.de',
+                 previous=None, cache_dir=None, checkpoint_file=None, partial=None):
+        self.base_url = base_url
         self.courses_file = filename
+        self.concurrency = concurrency or int(os.getenv("DISCORD_MODULE_SCRAPPER_CONCURRENCY", 4))
+        self.processes = processes if processes is not None else int(os.getenv("DISCORD_MODULE_PARSER_PROCESSES", 2))
+        partial = partial if partial is not None else bool(int(os.getenv("DISCORD_MODULE_PARSER_PARTIAL", 0)))
+        self.parser = Parser(base_url, partial=partial)
+        cache_dir = cache_dir or os.getenv("DISCORD_MODULE_CACHE_DIR")
+        self.cache = HttpCache(cache_dir) if cache_dir else None
+        self.previous = previous['modules'] if previous else {}
+        self.previous_courses = {course['short']: course for course in previous['courses_of_studies']} \
+            if previous else {}
+        self.checkpoint = Checkpoint(checkpoint_file) if checkpoint_file else None
+        self.resumed_pages = self.checkpoint.resumed("page") if self.checkpoint else {}
+        self.resumed_indexes = self.checkpoint.resumed("index") if self.checkpoint else {}
+        self.failures = []
+        self.session = None
+        self.executor = None
+        self.semaphores = {}
+        self.fetches = {}
+        self.pages = {}
+        self.stats = {"requests": 0, "bytes": 0, "not_modified": 0, "parsed": 0, "reused": 0, "resumed": 0,
+                      "retries": 0, "failed": 0, "duration": 0, "loop_blocked": 0, "loop_max_lag": 0}
 
     async def scrap(self):
+        start = time.perf_counter()
+        monitor = LoopMonitor()
+        monitor.start()
         courses_of_studies = self.load_courses_of_studies()
-        for course in courses_of_studies:
-            await self.fetch_module_infos_for_course_of_studies(course)
-        return courses_of_studies
+        timeout = aiohttp.ClientTimeout(total=60)
+        if self.processes > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout, raise_for_status=True) as self.session:
+                await asyncio.gather(*[self.fetch_module_infos_for_course_of_studies(course)
+                                       for course in courses_of_studies])
+        finally:
+            self.session = None
+            if self.executor:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+            monitor.stop()
+            if self.cache:
+                self.cache.save()
+            if self.checkpoint:
+                self.checkpoint.stop()
+        self.stats["duration"] = time.perf_counter() - start
+        self.stats["loop_blocked"] = monitor.blocked
+        self.stats["loop_max_lag"] = monitor.max_lag
+        return {"courses_of_studies": courses_of_studies,
+                "modules": {url: task.result() for url, task in self.pages.items() if task.result() is not None}}
 
     async def fetch_module_infos_for_course_of_studies(self, course):
-        url = course['url']
-        html = await self.fetch(url)
-        modules = self.parse_index_page(html)
-        for module in modules:
-            html = await self.fetch(module['url'])
-            module['page'] = self.parse_course_page(html, course)
-        course['modules'] = modules
-
-    def load_courses_of_studies(self):
-        group_file = open(self.courses_file, mode='r')
-        return json.load(group_file)
-
-    async def fetch(self, url):
-        sess = aiohttp.ClientSession()
-        req = await sess.get(url)
-        text = await req.read()
-        await sess.close()
-        return text
-
-    def prepare_url(self, url):
-        if re.search(r"^http(s)*://", url):
-            return url
-        elif re.search(r"^/", url):
-            return self.base_url + url
-        return self.base_url + "/" + url
-
-    def parse_index_page(self, html):
-        soup = BeautifulSoup(html, "html.parser")
-        modules_source = soup.findAll('a', text=re.compile(r'^[0-9]{5} '))
-        modules = []
-        for item in modules_source:
-            module = {
-                "title": item.get_text(),
-                "number": re.sub('^0+', '', re.search('^([0-9]+) ', item.get_text())[1]),
-                "url": self.prepare_url(item['href'])
-            }
-            modules.append(module)
-        return modules
-
-    def parse_course_page(self, html, stg):
-        soup = BeautifulSoup(html, "html.parser")
-        module = {
-            "title": self.parse_title(soup),
-            "infos": self.parse_infos(soup),
-            "courses": self.parse_courses(soup),
-            "support": self.parse_support(soup),
-            "exams": self.parse_exams(soup),
-            "downloads": self.parse_downloads(soup, stg),
-            "persons": self.parse_persons(soup)
-        }
-        return module
-
-    def parse_title(self, soup):
-        title = re.sub(
-            r" -.*FernUniversität in Hagen",
-            "",
-            soup.title.string,
-            flags=re.S
-        ).strip()
-        return title
-
-    def parse_infos(self, soup):
-        try:
-            info_source = soup.find(summary='Modulinformationen')
-        except:
-            return None
-        infos = {
-            "ects": info_source.find('th', text='ECTS').findNext('td').get_text(),
-            "time": info_source.find('th', text='Arbeitsaufwand').findNext('td').get_text(),
-            "duration": info_source.find('th', text='Dauer des Moduls').findNext('td').get_text(),
-            "interval": info_source.find('th', text='Häufigkeit des Moduls').findNext('td').get_text(),
-            "notes": info_source.find('th', text='Anmerkung').findNext('td').get_text(),
-            "requirements": info_source.find('th', text='Inhaltliche Voraussetzung').findNext('td').get_text()
-        }
-        return infos
-
-    def parse_courses(self, soup):
         try:
-            course_source = soup.find('h2', text=re.compile(r'Aktuelles Angebot')) \
-                .findNext('div') \
-                .findAll('a')
-        except:
-            return None
-        courses = []
-        for link in course_source:
-            course = {
-                "name": re.sub('^Kurs [0-9]+ ', '', link.get_text()),
-                "number": re.sub('^0+', '', re.search('([^/]+)$', link['href'])[1]),
-                "url": self.prepare_url(link['href'])
-            }
-            courses.append(course)
-        return courses
-
-    def parse_support(self, soup):
-        try:
-            support_source = soup.find('h2', text=re.compile(
-                r'Mentorielle Betreuung in Regional- und Studienzentren')).findNext('div').findAll('li')
-        except:
-            return None
+            modules = await self.index_page(course['url'])
+        except Exception as e:
+            self.fail(course['url'], e)
+            previous_course = self.previous_courses.get(course['short'], {})
+            modules = [dict(module) for module in previous_course.get('modules', [])]
 
-        supports = None
-        if support_source:
-            supports = []
-            for item in support_source:
-                support = {
-                    "title": item.get_text(),
-                    "city": item.find('a').get_text(),
-                    "url": self.prepare_url(item.find('a')['href'])
-                }
-                supports.append(support)
-        return supports
-
-    def parse_exams(self, soup):
-        try:
-            exam_source = soup.find(summary='Prüfungsinformationen')
-        except:
-            return None
-        stg = exam_source.findNext('th', colspan='2')
-        exams = []
-        while stg != None:
-            exam = {
-                "name": stg.get_text(),
-                "type": stg.findNext('th', text='Art der Prüfungsleistung').findNext('td').get_text(),
-                "requirements": stg.findNext('th', text='Voraussetzung').findNext('td').get_text(),
-                "weight": stg.findNext('th', text='Stellenwert der Note').findNext('td').get_text(),
-                "hard_requirements": stg.findNext('th', text='Formale Voraussetzungen').findNext('td').get_text()
-            }
-            exams.append(exam)
-            stg = stg.findNext('th', colspan='2')
-        return exams
-
-    def parse_downloads(self, soup, stg):
-        try:
-            source1 = soup.find('h2', text=re.compile(r'Download')) \
-                .findNext('ul', attrs={'class': 'pdfliste'}) \
-                .findAll('li', attrs={'class': None})
-            source2 = soup.find('h2', text=re.compile(r'Download')) \
-                .findNext('ul', attrs={'class': 'pdfliste'}) \
-                .findAll('li', attrs={'class': re.compile(stg['short'])})
+        pages = await asyncio.gather(*[self.module_page(module['url']) for module in modules])
+        course['modules'] = []
+        for module, page in zip(modules, pages):
+            if page is None:
+                continue  # failed without previous data
+            if 'stg_downloads' in page:
+                module['downloads'] = downloads_for_stg(page['stg_downloads'], course['short'])
+            course['modules'].append(module)
 
-            download_source = [*source1, *source2]
+    async def index_page(self, url):
+        if url in self.resumed_indexes:
+            return [dict(module) for module in self.resumed_indexes[url]]
 
-        except:
-            return None
+        html, _ = await self.fetch(url)
+        modules = await self.parse(self.parser.parse_index_page, html)
+        self.processed(url)
+        self.save_checkpoint("index", url, modules)
+        return [dict(module) for module in modules]
+
+    def module_page(self, url):
+        """ Fetch and parse a module page, every page only once per run """
+
+        if url not in self.pages:
+            self.pages[url] = asyncio.ensure_future(self.fetch_course_page(url))
+        return self.pages[url]
 
-        downloads = None
-        if download_source:
-            downloads = []
-            for item in download_source:
-                download = {
-                    "title": item.find('a').get_text(),
-                    "url": self.prepare_url(item.find('a')['href'])
-                }
-                downloads.append(download)
-        return downloads
-
-    def parse_persons(self, soup):
+    async def fetch_course_page(self, url):
+        if url in self.resumed_pages:
+            self.stats["resumed"] += 1
+            return self.resumed_pages[url]
+
+        reusable = self.reusable(url)
         try:
-            person_source = soup.find('h2', text=re.compile(
-                r'Ansprechpersonen')).findNext('ul').findAll('h4')
-        except:
+            html, changed = await self.fetch(url, need_content=not reusable)
+            if not changed and reusable:
+                self.stats["reused"] += 1
+                page = await self.load_previous(url)
+                self.processed(url)  # commit the validators of this response, e.g. a new ETag
+                return page
+
+            page = await self.parse(self.parser.parse_course_page, html)
+        except Exception as e:
+            self.fail(url, e)
+            return await self.load_previous(url)
+
+        self.stats["parsed"] += 1
+        self.processed(url)
+        self.save_checkpoint("page", url, page)
+        return page
+
+    def reusable(self, url):
+        """ Whether the previous page can be used if the page didn't change, without loading it (pages converted
+        from the old format lack stg_downloads) """
+
+        if isinstance(self.previous, LazyModules):
+            return url in self.previous and self.previous.has_stg_downloads(url)
+        return url in self.previous and 'stg_downloads' in self.previous[url]
+
+    async def load_previous(self, url):
+        """ The previous page or None. Pages of the module store are read in a thread and bypass its cache. """
+
+        if url not in self.previous:
             return None
-        persons = []
-        for item in person_source:
-            persons.append(item.get_text())
-        return persons
+        if isinstance(self.previous, LazyModules):
+            return await asyncio.get_event_loop().run_in_executor(None, self.previous.read, url)
+        return self.previous[url]
+
+    def processed(self, url):
+        if self.cache:
+            self.cache.commit(url)
+
+    def save_checkpoint(self, kind, url, result):
+        if self.checkpoint:
+            self.checkpoint.append({kind: url, "result": result})
+
+    def fail(self, url, error):
+        """ Record a page that could not be scraped, the previous data of this page is used instead """
+
+        self.stats["failed"] += 1
+        self.failures.append((url, error))
+        if self.cache:
+            self.cache.forget(url)  # request and parse it completely next time
+        print(f"Can't scrap {url}: {error!r}")
+        if not isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    async def parse(self, function, *args):
+        """ Run a parser function in the process pool, or directly if no pool is used """
+
+        if not self.executor:
+            return function(*args)
+        return await asyncio.get_event_loop().run_in_executor(self.executor, function, *args)
+
+    def load_courses_of_studies(self):
+        return storage.load(self.courses_file)
+
+    def semaphore(self, url):
+        host = urlparse(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(self.concurrency)
+        return self.semaphores[host]
+
+    async def fetch(self, url, need_content=True):
+        """ Returns the content of url and whether it changed since the last run. Every url is requested only once
+        per run. Without need_content, None is returned instead of the cached content of an unchanged page. """
+
+        if url not in self.fetches:
+            self.fetches[url] = asyncio.ensure_future(self.request(url))
+        body, changed = await self.fetches[url]
+
+        if body is None and need_content:
+            if (body := self.cache.body(url)) is None:
+                # cache entry without content, fetch the complete page again
+                body, changed = await self.request(url, conditional=False)
+        return body, changed
+
+    async def request(self, url, conditional=True):
+        """ Request url, failed requests are retried with exponential backoff """
+
+        for attempt in range(RETRIES + 1):
+            try:
+                return await self.request_once(url, conditional)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == RETRIES or not self.retryable(e):
+                    raise
+                self.stats["retries"] += 1
+                await asyncio.sleep(BACKOFF * 2 ** attempt)
+
+    def retryable(self, error):
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status >= 500 or error.status == 429
+        return True
+
+    async def request_once(self, url, conditional):
+        headers = self.cache.headers(url) if self.cache and conditional else {}
+        async with self.semaphore(url):
+            async with self.session.get(url, headers=headers) as response:
+                status = response.status
+                response_headers = response.headers
+                body = await response.read()
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(body)
+
+        if not self.cache:
+            return body, True
+        if status == 304:
+            self.stats["not_modified"] += 1
+            return None, False
+        return body, self.cache.store(url, response_headers, body)
@@ -0,0 +1,113 @@
+import math
+import re
+from bisect import bisect_left
+
+import storage
+
+"""
+  Volltextsuche über die Moduldaten. Für jedes Modul werden die Begriffe aus Titel, Ansprechpersonen,
+  Voraussetzungen, Prüfungsarten und Kursnamen mit einer Gewichtung gespeichert, zusammen mit dem Hash der
+  Modulseite. Bei einer Aktualisierung werden nur Module mit geändertem Hash neu indiziert. Die Begriffe werden
+  in der Datei search.json im Verzeichnis der Moduldaten gespeichert, sodass beim Start keine Modulseiten geladen
+  werden müssen.
+"""
+
+WEIGHTS = {"title": 5, "courses": 3, "persons": 3, "exams": 2, "requirements": 1}
+MIN_PREFIX_LENGTH = 3
+
+
+def tokenize(text):
+    return [token for token in re.findall(r"\w+", text.lower()) if len(token) > 1]
+
+
+def module_fields(page):
+    """ Texts of a module page by field """
+
+    infos = page.get('infos') or {}
+    exams = page.get('exams') or []
+    return {
+        "title": [page.get('title') or ""],
+        "courses": [f"{course['number']} {course['name']}" for course in page.get('courses') or []],
+        "persons": page.get('persons') or [],
+        "exams": [exam['type'] for exam in exams],
+        "requirements": [infos.get('requirements') or "",
+                         *[exam['requirements'] for exam in exams],
+                         *[exam['hard_requirements'] for exam in exams]]
+    }
+
+
+def module_terms(page):
+    terms = {}
+    for field, texts in module_fields(page).items():
+        for text in texts:
+            for token in tokenize(text):
+                terms[token] = max(terms.get(token, 0), WEIGHTS[field])
+    return terms
+
+
+class SearchIndex:
+    def __init__(self, file):
+        self.file = file
+        self.documents = storage.load(file, {})
+        self.postings = {}
+        self.vocabulary = []
+        self.build_postings()
+
+    def build_postings(self):
+        postings = {}
+        for url, document in self.documents.items():
+            for term, weight in document['terms'].items():
+                postings.setdefault(term, {})[url] = weight
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+
+    def update(self, modules):
+        """ Bring the index up to date with modules (LazyModules). Only changed pages are loaded and indexed. """
+
+        changed = False
+        for url in list(self.documents):
+            if url not in modules:
+                del self.documents[url]
+                changed = True
+
+        for url in modules:
+            if (document := self.documents.get(url)) and document['hash'] == modules.hash(url):
+                continue
+            self.documents[url] = {"hash": modules.hash(url), "terms": module_terms(modules[url])}
+            changed = True
+
+        if changed:
+            self.build_postings()
+            storage.save(self.file, self.documents)
+
+    def matching_terms(self, token):
+        """ Index terms matching a search token, also as prefix for longer tokens """
+
+        if len(token) < MIN_PREFIX_LENGTH:
+            return [token] if token in self.postings else []
+
+        terms = []
+        position = bisect_left(self.vocabulary, token)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+            terms.append(self.vocabulary[position])
+            position += 1
+        return terms
+
+    def search(self, query, limit=10):
+        """ Returns the urls of the best matching modules. Modules matching more search terms come first,
+        then modules with a higher score (field weight and rarity of the term). """
+
+        matches = {}
+        scores = {}
+        for token in set(tokenize(query)):
+            best = {}
+            for term in self.matching_terms(token):
+                idf = math.log(1 + len(self.documents) / len(self.postings[term]))
+                for url, weight in self.postings[term].items():
+                    best[url] = max(best.get(url, 0), weight * idf)
+            for url, score in best.items():
+                matches[url] = matches.get(url, 0) + 1
+                scores[url] = scores.get(url, 0) + score
+
+        ranking = sorted(scores, key=lambda url: (matches[url], scores[url]), reverse=True)
+        return ranking[:limit]
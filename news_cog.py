@@ -1,55 +1,111 @@
-import json
+import asyncio
+import hashlib
 import os
+import traceback
 
-import requests
+import aiohttp
 from bs4 import BeautifulSoup
 from discord.ext import commands, tasks
+import storage
+
+"""
+    Postet Neuigkeiten der Fakultät in den News-Channel.
+
+    DISCORD_NEWS_INTERVAL - (optional) Abfrageintervall in Minuten, Standard ist 60.
+
+    Die Seite wird mit If-None-Match/If-Modified-Since abgefragt. Hat sie sich nicht geändert (304 oder gleicher
+    Inhalt), wird nichts geparst. Das Parsen selbst läuft in einem Thread, damit der Event-Loop nicht blockiert.
+"""
 
 
 class NewsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
         self.channel_id = int(os.getenv("DISCORD_NEWS_CHANNEL"))
         self.news_role = int(os.getenv("DISCORD_NEWS_ROLE"))
         self.url = "https://www.fernuni-hagen.de/mi/studium/aktuelles/index.shtml"
         self.news = {}
+        self.session = None
+        self.etag = None
+        self.last_modified = None
+        self.content_hash = None
         self.load_news()
+        self.news_loop.change_interval(minutes=int(os.getenv("DISCORD_NEWS_INTERVAL", 60)))
         self.news_loop.start()
 
+    def cog_unload(self):
+        self.news_loop.cancel()
+        if self.session:
+            asyncio.ensure_future(self.session.close())
+
     def load_news(self):
-        news_file = open("news.json", mode="r")
-        self.news = json.load(news_file)
+        self.news = storage.load("news.json")
 
     def save_news(self):
-        news_file = open("news.json", mode="w")
-        json.dump(self.news, news_file)
+        storage.save("news.json", self.news)
+
+    async def fetch(self):
+        """ Returns the content of the news page or None, if it has not changed since the last request """
+
+        if not self.session:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        async with self.session.get(self.url, headers=headers) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            content = await response.read()
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash == self.content_hash:
+            return None
+        self.content_hash = content_hash
+        return content
+
+    def parse(self, content):
+        soup = BeautifulSoup(content, "html.parser")
+        entries = []
+
+        for news in soup.find("ul", attrs={"class": "fu-link-list"}).find_all("li"):
+            link = news.a['href']
+            if link[0] == "/":
+                link = f"https://www.fernuni-hagen.de" + link
+            entries.append((news.span.text, str(news.a.text), link))
+
+        return entries
 
     @tasks.loop(hours=1)
     async def news_loop(self):
         try:
-            req = requests.get(self.url)
-            soup = BeautifulSoup(req.content, "html.parser")
-            channel = await self.bot.fetch_channel(self.channel_id)
-
-            for news in soup.find("ul", attrs={"class": "fu-link-list"}).find_all("li"):
-                date = news.span.text
-                title = str(news.a.text)
-                link = news.a['href']
-
-                if link[0] == "/":
-                    link = f"https://www.fernuni-hagen.de" + link
-
-                if not self.news.get(link):
-                    await channel.send(
-                        f":loudspeaker: <@&{self.news_role}> Neues aus der Fakultät vom {date} :loudspeaker: \n{title} \n{link}")
-                    self.news[link] = date
-                else:
-                    prev_date = self.news[link]
-                    if date != prev_date:
-                        await channel.send(
-                            f":loudspeaker: <@&{self.news_role}> Neues aus der Fakultät vom {date} :loudspeaker: \n{title} \n{link}")
-                        self.news[link] = date
-
-            self.save_news()
-        except:
-            pass
+            if content := await self.fetch():
+                entries = await self.bot.loop.run_in_executor(None, self.parse, content)
+                await self.post_news(entries)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Can't fetch news: {e!r}")
+        except Exception:
+            traceback.print_exc()
+            # request and process the complete page again next time
+            self.etag = self.last_modified = self.content_hash = None
+
+    async def post_news(self, entries):
+        channel = await self.resolver.channel(self.channel_id)
+
+        for date, title, link in entries:
+            if self.news.get(link) != date:
+                await channel.send(
+                    f":loudspeaker: <@&{self.news_role}> Neues aus der Fakultät vom {date} :loudspeaker: \n{title} \n{link}")
+                self.news[link] = date
+                self.save_news()
+
+    @news_loop.before_loop
+    async def before_news_loop(self):
+        await self.bot.wait_until_ready()
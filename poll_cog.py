@@ -12,7 +12,9 @@ OPTIONS = ["🇦", "🇧", "🇨", "🇩", "🇪", "🇫", "🇬", "🇭", "🇮
 class PollCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
         self.poll_sugg_channel = int(os.getenv("DISCORD_POLL_SUGG_CHANNEL"))
+        bot.get_cog("ReactionRouter").add_embed("Umfrage", self.handle_poll_reaction, emojis=["🗑️", "🛑"])
 
     @help(
         category="poll",
@@ -26,7 +28,7 @@ class PollCog(commands.Cog):
     )
     @commands.command(name="add-poll")
     async def cmd_add_poll(self, ctx, question, *answers):
-        channel = await self.bot.fetch_channel(self.poll_sugg_channel)
+        channel = await self.resolver.channel(self.poll_sugg_channel)
         msg = f"<@!{ctx.author.id}> hat folgende Umfrage vorgeschlagen:\nFrage:{question}\n\nAntwortoptionen:\n"
         poll = f"!poll \"{question}\""
         
@@ -77,21 +79,13 @@ class PollCog(commands.Cog):
 
         await Poll(self.bot, question, answers, ctx.author.id).send_poll(ctx)
 
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.user_id == self.bot.user.id:
-            return
-
-        if payload.emoji.name in ["🗑️", "🛑"]:
-            channel = await self.bot.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            if len(message.embeds) > 0 and message.embeds[0].title == "Umfrage":
-                poll = Poll(self.bot, message=message)
-                if str(payload.user_id) == poll.author:
-                    if payload.emoji.name == "🗑️":
-                        await poll.delete_poll()
-                    else:
-                        await poll.close_poll()
+    async def handle_poll_reaction(self, payload, message):
+        poll = Poll(self.bot, message=message)
+        if str(payload.user_id) == poll.author:
+            if payload.emoji.name == "🗑️":
+                await poll.delete_poll()
+            else:
+                await poll.close_poll()
 
     async def cog_command_error(self, ctx, error):
         await handle_error(ctx, error)
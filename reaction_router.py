@@ -0,0 +1,98 @@
+from discord.ext import commands
+
+"""
+    Zentrale Verteilung von Reaktionen.
+
+    Cogs registrieren hier die Nachrichten (per ID), Embed-Arten (per Titel) oder Emojis, für die sie zuständig sind.
+    Jede Reaktion wird an höchstens einen Handler weitergegeben und die Nachricht wird höchstens einmal geladen.
+    Handler haben die Signatur `async def handler(payload, message)`. `message` ist nur gesetzt, wenn bei der
+    Registrierung `fetch=True` angegeben wurde, ansonsten `None`.
+"""
+
+REACTION_ADD = "REACTION_ADD"
+REACTION_REMOVE = "REACTION_REMOVE"
+
+
+def emoji_key(emoji):
+    """ Custom emojis are identified by their id, unicode emojis by their name """
+
+    return emoji.id if emoji.id else emoji.name
+
+
+class Route:
+    def __init__(self, handler, emojis=None, fetch=False, channel_id=None):
+        self.handler = handler
+        self.emojis = emojis
+        self.fetch = fetch
+        self.channel_id = channel_id
+
+    def accepts(self, payload):
+        if self.channel_id and payload.channel_id != self.channel_id:
+            return False
+        return self.emojis is None or emoji_key(payload.emoji) in self.emojis
+
+
+class ReactionRouter(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
+        self.messages = {REACTION_ADD: {}, REACTION_REMOVE: {}}
+        self.embeds = {REACTION_ADD: {}, REACTION_REMOVE: {}}
+        self.emojis = {REACTION_ADD: {}, REACTION_REMOVE: {}}
+
+    def add_message(self, message_id, handler, emojis=None, fetch=False, event_type=REACTION_ADD):
+        """ Route reactions on the message with the given id to handler """
+
+        self.messages[event_type][int(message_id)] = Route(handler, emojis, fetch)
+
+    def remove_message(self, message_id, event_type=None):
+        for event in [event_type] if event_type else self.messages.keys():
+            self.messages[event].pop(int(message_id), None)
+
+    def add_embed(self, title, handler, emojis, channel_id=None, event_type=REACTION_ADD):
+        """ Route reactions on messages whose first embed has the given title to handler.
+        Messages are only fetched, if the reaction uses one of the given emojis. """
+
+        self.embeds[event_type][title] = Route(handler, emojis, True, channel_id)
+
+    def add_emoji(self, emoji, handler, fetch=False, event_type=REACTION_ADD):
+        """ Route reactions with the given emoji on any other message to handler """
+
+        self.emojis[event_type][emoji] = Route(handler, None, fetch)
+
+    async def fetch_message(self, payload):
+        return await self.resolver.message(payload.channel_id, payload.message_id)
+
+    async def dispatch(self, payload):
+        if payload.user_id == self.bot.user.id:
+            return
+
+        event_type = payload.event_type
+        message = None
+
+        if (route := self.messages[event_type].get(payload.message_id)) and route.accepts(payload):
+            if route.fetch:
+                message = await self.fetch_message(payload)
+            await route.handler(payload, message)
+            return
+
+        embed_routes = [route for route in self.embeds[event_type].values() if route.accepts(payload)]
+        if len(embed_routes) > 0:
+            message = await self.fetch_message(payload)
+            if len(message.embeds) > 0 and (route := self.embeds[event_type].get(message.embeds[0].title)) \
+                    and route in embed_routes:
+                await route.handler(payload, message)
+                return
+
+        if route := self.emojis[event_type].get(emoji_key(payload.emoji)):
+            if route.fetch and not message:
+                message = await self.fetch_message(payload)
+            await route.handler(payload, message)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        await self.dispatch(payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        await self.dispatch(payload)
@@ -0,0 +1,179 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+import utils
+from help.help import help, handle_error
+
+"""
+    Zentraler Zugriff auf Channels, Nachrichten, User, Guilds und Member.
+
+    Zuerst wird im Gateway-Cache von discord.py gesucht, danach in einem begrenzten LRU-Cache mit TTL und erst
+    dann wird die REST-API angefragt. Gleichzeitige Anfragen für dieselbe ID teilen sich einen REST-Aufruf.
+"""
+
+
+class Resolver(commands.Cog):
+    def __init__(self, bot, max_size=1000, ttl=300):
+        self.bot = bot
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.stats = {"gateway": 0, "hits": 0, "misses": 0, "coalesced": 0}
+
+    def get_cached(self, key):
+        if entry := self.cache.get(key):
+            expires, obj = entry
+            if expires > time.monotonic():
+                self.cache.move_to_end(key)
+                return obj
+            del self.cache[key]
+        return None
+
+    def put(self, key, obj):
+        self.cache[key] = (time.monotonic() + self.ttl, obj)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def invalidate(self, *key):
+        self.cache.pop(key, None)
+
+    async def resolve(self, key, gateway, fetch):
+        """ Look up key in the gateway cache, then the LRU cache and finally fetch it via REST """
+
+        if obj := gateway():
+            self.stats["gateway"] += 1
+            return obj
+
+        if obj := self.get_cached(key):
+            self.stats["hits"] += 1
+            return obj
+
+        if task := self.pending.get(key):
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(fetch())
+            self.pending[key] = task
+            task.add_done_callback(lambda t: self.pending.pop(key, None))
+
+        obj = await asyncio.shield(task)
+        self.put(key, obj)
+        return obj
+
+    async def channel(self, channel_id):
+        channel_id = int(channel_id)
+        return await self.resolve(("channel", channel_id),
+                                  lambda: self.bot.get_channel(channel_id),
+                                  lambda: self.bot.fetch_channel(channel_id))
+
+    async def message(self, channel_id, message_id):
+        message_id = int(message_id)
+
+        async def fetch():
+            channel = await self.channel(channel_id)
+            return await channel.fetch_message(message_id)
+
+        return await self.resolve(("message", message_id),
+                                  lambda: discord.utils.get(reversed(self.bot.cached_messages), id=message_id),
+                                  fetch)
+
+    async def user(self, user_id):
+        user_id = int(user_id)
+        return await self.resolve(("user", user_id),
+                                  lambda: self.bot.get_user(user_id),
+                                  lambda: self.bot.fetch_user(user_id))
+
+    async def guild(self, guild_id):
+        guild_id = int(guild_id)
+        return await self.resolve(("guild", guild_id),
+                                  lambda: self.bot.get_guild(guild_id),
+                                  lambda: self.bot.fetch_guild(guild_id))
+
+    async def member(self, guild_id, user_id):
+        guild = await self.guild(guild_id)
+        user_id = int(user_id)
+        return await self.resolve(("member", guild.id, user_id),
+                                  lambda: guild.get_member(user_id),
+                                  lambda: guild.fetch_member(user_id))
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        self.invalidate("message", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        self.invalidate("message", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.invalidate("message", message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        self.invalidate("message", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self.invalidate("message", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear(self, payload):
+        self.invalidate("message", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_clear_emoji(self, payload):
+        self.invalidate("message", payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        self.invalidate("channel", after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.invalidate("channel", channel.id)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before, after):
+        self.invalidate("guild", after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.invalidate("guild", guild.id)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        self.invalidate("user", after.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        self.invalidate("member", after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.invalidate("member", member.guild.id, member.id)
+
+    @help(
+        category="info",
+        brief="Zeigt an, wie viele REST-Aufrufe durch den Cache eingespart wurden.",
+        mod=True
+    )
+    @commands.command(name="cache-stats")
+    @commands.check(utils.is_mod)
+    async def cmd_cache_stats(self, ctx):
+        saved = self.stats["gateway"] + self.stats["hits"] + self.stats["coalesced"]
+        await ctx.send(f"Gateway-Cache: {self.stats['gateway']}\n"
+                       f"LRU-Cache Treffer: {self.stats['hits']}\n"
+                       f"Zusammengefasste Anfragen: {self.stats['coalesced']}\n"
+                       f"REST-Aufrufe: {self.stats['misses']}\n"
+                       f"Eingesparte REST-Aufrufe: {saved}\n"
+                       f"Einträge im Cache: {len(self.cache)}/{self.max_size}")
+
+    async def cog_command_error(self, ctx, error):
+        await handle_error(ctx, error)
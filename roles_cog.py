@@ -1,11 +1,31 @@
-import json
+import asyncio
 import os
+import time
+import traceback
+from datetime import datetime
 
 import discord
 from discord.ext import commands
 
+import storage
 import utils
 from help.help import help, handle_error, help_category
+from member_stats import MEMBERS, WITHOUT_ROLE
+from reaction_router import emoji_key
+from stats_history import parse_range
+
+
+def reaction_key(emoji):
+    """ Custom emojis are compared by id, unicode emojis by their text """
+
+    return getattr(emoji, 'id', None) or str(emoji)
+
+
+def embed_content(embed):
+    """ The parts of an embed used by the role messages, without surrounding whitespace (stripped by Discord) """
+
+    return (embed.title, str(embed.description).strip(),
+            [(field.name.strip(), field.value.strip(), field.inline) for field in embed.fields])
 
 
 @help_category("updater", "Updater", "Diese Kommandos werden zum Updaten von Nachrichten benutzt, die Boty automatisch erzeugt.")
@@ -13,19 +33,46 @@ from help.help import help, handle_error, help_category
 class RolesCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
+        self.member_stats = bot.get_cog("MemberStats")
         self.roles_file = os.getenv("DISCORD_ROLES_FILE")
+        self.guild_id = int(os.getenv("DISCORD_GUILD"))
         self.channel_id = int(os.getenv("DISCORD_ROLLEN_CHANNEL"))
         self.degree_program_message_id = int(os.getenv("DISCORD_DEGREE_PROGRAM_MSG"))
         self.color_message_id = int(os.getenv("DISCORD_COLOR_MSG"))
         self.special_message_id = int(os.getenv("DISCORD_SPECIAL_MSG"))
+        self.role_change_delay = float(os.getenv("DISCORD_ROLE_CHANGE_DELAY", 2))
+        self.role_changes = {}
         self.assignable_roles = {}
+        self.emoji_roles = {}
         self.load_roles()
 
+        reactions = bot.get_cog("ReactionRouter")
+        for message_id in [self.degree_program_message_id, self.color_message_id, self.special_message_id]:
+            reactions.add_message(message_id, self.handle_role_reaction)
+
     def load_roles(self):
         """ Loads all assignable roles from ROLES_FILE """
 
-        roles_file = open(self.roles_file, mode='r')
-        self.assignable_roles = json.load(roles_file)
+        self.assignable_roles = storage.load(self.roles_file)
+
+    def build_emoji_roles(self):
+        """ Index of all assignable roles by the key of their emoji (id of custom emojis, name of unicode emojis).
+        If an emoji is used in more than one kind of roles, the first (degree program, color, special) wins. """
+
+        guild = self.bot.get_guild(self.guild_id)
+        if not guild:
+            return
+
+        emojis = {emoji.name: emoji for emoji in self.bot.emojis}
+        roles = {role.name: role for role in guild.roles}
+        emoji_roles = {}
+        for assignable in self.assignable_roles:
+            for emoji_name, role_name in assignable.items():
+                if role := roles.get(role_name):
+                    key = emojis[emoji_name].id if emoji_name in emojis else emoji_name
+                    emoji_roles.setdefault(key, role)
+        self.emoji_roles = emoji_roles
 
     def get_degree_program_emojis(self):
         """ Creates a dict for degree program role emojis """
@@ -74,34 +121,78 @@ class RolesCog(commands.Cog):
         category="info",
         brief="Gibt die Mitgliederstatistik aus."
     )
-    @commands.command(name="stats")
+    @commands.group(name="stats", invoke_without_command=True)
     async def cmd_stats(self, ctx):
         """ Sends stats in Chat. """
 
         guild = ctx.guild
-        members = await guild.fetch_members().flatten()
+        stats = self.member_stats
+        stats.ensure_seeded(guild)
         answer = f''
         embed = discord.Embed(title="Statistiken",
-                              description=f'Wir haben aktuell {len(members)} Mitglieder auf diesem Server, verteilt auf folgende Rollen:')
+                              description=f'Wir haben aktuell {stats.members} Mitglieder auf diesem Server, verteilt auf folgende Rollen:')
 
         for role in guild.roles:
             if not self.get_key(role):
                 continue
-            role_members = role.members
-            if len(role_members) > 0 and not role.name.startswith("Farbe"):
-                embed.add_field(name=role.name, value=f'{len(role_members)} Mitglieder', inline=False)
-
-        no_role = 0
-        for member in members:
-            # ToDo Search for study roles only!
-            if len(member.roles) == 1:
-                no_role += 1
+            role_members = stats.count(role)
+            if role_members > 0 and not role.name.startswith("Farbe"):
+                embed.add_field(name=role.name, value=f'{role_members} Mitglieder', inline=False)
 
+        # ToDo Search for study roles only!
         embed.add_field(name="\u200B", value="\u200b", inline=False)
-        embed.add_field(name="Mitglieder ohne Rolle", value=str(no_role), inline=False)
+        embed.add_field(name="Mitglieder ohne Rolle", value=str(stats.without_role), inline=False)
 
         await ctx.channel.send(answer, embed=embed)
 
+    @help(
+        command_group="stats",
+        category="info",
+        syntax="!stats history <rolle> <zeitraum?>",
+        example="!stats history Mitglieder 6m",
+        parameters={
+            "rolle": "Name der Rolle (in Anführungszeichen, wenn er Leerzeichen enthält), \"Mitglieder\" für alle Mitglieder oder \"ohne Rolle\" für Mitglieder ohne Rolle",
+            "zeitraum": "*(optional)* Zeitraum, z. B. 12h, 30d, 4w, 6m oder 1y (Standard 30d)"
+        },
+        brief="Zeigt den Verlauf der Mitgliederzahl einer Rolle."
+    )
+    @cmd_stats.command(name="history", aliases=["verlauf"])
+    async def cmd_stats_history(self, ctx, role, time_range="30d"):
+        history = self.member_stats.history
+        if not history:
+            await ctx.send("Der Verlauf der Mitgliederzahlen wird nicht aufgezeichnet.")
+            return
+
+        if not (seconds := parse_range(time_range)):
+            await ctx.send(f"Unbekannter Zeitraum \"{time_range}\", möglich sind z. B. 12h, 30d, 4w, 6m oder 1y.")
+            return
+
+        if role.lower() == "mitglieder":
+            name, title = MEMBERS, "Mitglieder"
+        elif role.lower() == "ohne rolle":
+            name, title = WITHOUT_ROLE, "Mitglieder ohne Rolle"
+        elif guild_role := discord.utils.get(ctx.guild.roles, name=role):
+            name, title = str(guild_role.id), guild_role.name
+        else:
+            await ctx.send(f"Die Rolle \"{role}\" gibt es nicht.")
+            return
+
+        end = time.time()
+        if not (summary := history.summary(name, end - seconds, end)):
+            await ctx.send(f"Für {title} gibt es in diesem Zeitraum noch keine Messungen.")
+            return
+
+        date_format = os.getenv("DISCORD_DATE_TIME_FORMAT")
+        embed = discord.Embed(title=f"Verlauf: {title}",
+                              description=f"`{summary['sparkline']}`\n"
+                                          f"{datetime.fromtimestamp(summary['first']).strftime(date_format)} bis "
+                                          f"{datetime.fromtimestamp(summary['last']).strftime(date_format)}, "
+                                          f"{summary['samples']} Messungen")
+        embed.add_field(name="Minimum", value=str(summary['min']))
+        embed.add_field(name="Durchschnitt", value=f"{summary['mean']:.1f}")
+        embed.add_field(name="Maximum", value=str(summary['max']))
+        await ctx.send(embed=embed)
+
     @help(
         category="updater",
         brief="Aktualisiert die Vergabe-Nachricht von Studiengangs-Rollen.",
@@ -110,8 +201,7 @@ class RolesCog(commands.Cog):
     @commands.command("update-degree-program")
     @commands.check(utils.is_mod)
     async def cmd_update_degree_program(self, ctx):
-        channel = await self.bot.fetch_channel(self.channel_id)
-        message = await channel.fetch_message(self.degree_program_message_id)
+        message = await self.resolver.message(self.channel_id, self.degree_program_message_id)
         degree_program_emojis = self.get_degree_program_emojis()
 
         embed = discord.Embed(title="Vergabe von Studiengangs-Rollen",
@@ -126,12 +216,7 @@ class RolesCog(commands.Cog):
                         value=value,
                         inline=False)
 
-        await message.edit(content="", embed=embed)
-        await message.clear_reactions()
-
-        for emoji in degree_program_emojis.values():
-            if emoji:
-                await message.add_reaction(emoji)
+        await self.update_message(message, embed, [emoji for emoji in degree_program_emojis.values() if emoji])
 
     @help(
         category="updater",
@@ -141,19 +226,13 @@ class RolesCog(commands.Cog):
     @commands.command("update-color")
     @commands.check(utils.is_mod)
     async def cmd_update_color(self, ctx):
-        channel = await self.bot.fetch_channel(self.channel_id)
-        message = await channel.fetch_message(self.color_message_id)
+        message = await self.resolver.message(self.channel_id, self.color_message_id)
         color_emojis = self.get_color_emojis()
 
         embed = discord.Embed(title="Vergabe von Farb-Rollen",
                               description="Durch klicken auf die entsprechende Reaktion kannst du dir die damit assoziierte Rolle zuweisen, oder entfernen. Dies funktioniert so, dass ein Klick auf die Reaktion die aktuelle Zuordnung dieser Rolle ändert. Das bedeutet, wenn du die Rolle, die mit <:FarbeGruen:771451407916204052> assoziiert ist, schon hast, aber die Reaktion noch nicht ausgewählt hast, dann wird dir bei einem Klick auf die Reaktion diese Rolle wieder weggenommen. ")
 
-        await message.edit(content="", embed=embed)
-        await message.clear_reactions()
-
-        for emoji in color_emojis.values():
-            if emoji:
-                await message.add_reaction(emoji)
+        await self.update_message(message, embed, [emoji for emoji in color_emojis.values() if emoji])
 
     @help(
         category="updater",
@@ -163,8 +242,7 @@ class RolesCog(commands.Cog):
     @commands.command("update-special")
     @commands.check(utils.is_mod)
     async def cmd_update_special(self, ctx):
-        channel = await self.bot.fetch_channel(self.channel_id)
-        message = await channel.fetch_message(self.special_message_id)
+        message = await self.resolver.message(self.channel_id, self.special_message_id)
         special_emojis = self.get_special_emojis()
 
         embed = discord.Embed(title="Vergabe von Spezial-Rollen",
@@ -178,51 +256,106 @@ class RolesCog(commands.Cog):
                         value=value,
                         inline=False)
 
-        await message.edit(content="", embed=embed)
-        await message.clear_reactions()
+        await self.update_message(message, embed, list(special_emojis.keys()))
 
-        for emoji in special_emojis.keys():
-            await message.add_reaction(emoji)
+    async def update_message(self, message, embed, emojis):
+        """ Edit a role assignment message only if its embed changed, and only add or remove the reactions that
+        differ from emojis. Reactions of other emojis are removed completely, missing ones are added by the bot. """
 
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.user_id == self.bot.user.id or payload.message_id not in [self.degree_program_message_id,
-                                                                             self.color_message_id,
-                                                                             self.special_message_id]:
+        if message.content or len(message.embeds) == 0 or embed_content(message.embeds[0]) != embed_content(embed):
+            await message.edit(content="", embed=embed)
+
+        wanted = {reaction_key(emoji) for emoji in emojis}
+        present = set()
+        for reaction in message.reactions:
+            if reaction_key(reaction.emoji) not in wanted:
+                await message.clear_reaction(reaction.emoji)
+            elif reaction.me:
+                present.add(reaction_key(reaction.emoji))
+
+        for emoji in emojis:
+            if reaction_key(emoji) not in present:
+                await message.add_reaction(emoji)
+
+    async def handle_role_reaction(self, payload, message):
+        if not (role := self.emoji_roles.get(emoji_key(payload.emoji))):
             return
 
-        if payload.emoji.name not in self.assignable_roles[0] and payload.emoji.name not in self.assignable_roles[
-            1] and payload.emoji.name not in self.assignable_roles[2]:
+        member = payload.member or await self.resolver.member(payload.guild_id, payload.user_id)
+        channel = await self.resolver.channel(payload.channel_id)
+        await channel.get_partial_message(payload.message_id).remove_reaction(payload.emoji, member)
+        self.queue_role_change(member, role)
+
+    def queue_role_change(self, member, role):
+        """ Collect the clicks of a member, they are applied together after role_change_delay seconds """
+
+        if member.id in self.role_changes:
+            self.role_changes[member.id].append(role)
             return
 
-        role_name = ""
-        guild = await self.bot.fetch_guild(payload.guild_id)
-        member = await guild.fetch_member(payload.user_id)
-        channel = await self.bot.fetch_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-        roles = member.roles
+        self.role_changes[member.id] = [role]
+        asyncio.ensure_future(self.apply_role_changes(member))
+
+    async def apply_role_changes(self, member):
+        """ Apply the collected clicks of a member, until no more clicks come in during role_change_delay """
+
+        while True:
+            await asyncio.sleep(self.role_change_delay)
+            clicked = self.role_changes[member.id]
+            if len(clicked) == 0:
+                del self.role_changes[member.id]
+                return
+
+            self.role_changes[member.id] = []
+            member = member.guild.get_member(member.id) or member  # current roles from the gateway cache
+            try:
+                await self.change_roles(member, clicked)
+            except Exception:
+                traceback.print_exc()
+
+    async def change_roles(self, member, clicked):
+        """ Toggle every clicked role once, in the order of the clicks. All changes are made with one request and
+        reported in one DM. """
+
+        roles = [role for role in member.roles if not role.is_default()]
+        for role in clicked:
+            if role in roles:
+                roles.remove(role)
+            else:
+                roles.append(role)
+
+        lines = []
+        for role in dict.fromkeys(clicked):
+            if role in roles and role not in member.roles:
+                lines.append(f"Rolle \"{role.name}\" erfolgreich hinzugefügt")
+            elif role not in roles and role in member.roles:
+                lines.append(f"Rolle \"{role.name}\" erfolgreich entfernt")
+        if len(lines) == 0:
+            return  # every role was clicked an even number of times
+
+        await member.edit(roles=roles)
+        await utils.send_dm(member, "\n".join(lines))
 
-        await message.remove_reaction(payload.emoji, member)
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.build_emoji_roles()
 
-        if payload.emoji.name in self.assignable_roles[0]:
-            role_name = self.assignable_roles[0].get(payload.emoji.name)
-        elif payload.emoji.name in self.assignable_roles[1]:
-            role_name = self.assignable_roles[1].get(payload.emoji.name)
-        else:
-            role_name = self.assignable_roles[2].get(payload.emoji.name)
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.build_emoji_roles()
 
-        for role in roles:
-            if role.name == role_name:
-                await member.remove_roles(role)
-                await utils.send_dm(member, f"Rolle \"{role.name}\" erfolgreich entfernt")
-                break
-        else:
-            guild_roles = guild.roles
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name:
+            self.build_emoji_roles()
 
-            for role in guild_roles:
-                if role.name == role_name:
-                    await member.add_roles(role)
-                    await utils.send_dm(member, f"Rolle \"{role.name}\" erfolgreich hinzugefügt")
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.build_emoji_roles()
+
+    @commands.Cog.listener()
+    async def on_guild_emojis_update(self, guild, before, after):
+        self.build_emoji_roles()
 
     async def cog_command_error(self, ctx, error):
         await handle_error(ctx, error)
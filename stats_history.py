@@ -0,0 +1,125 @@
+import os
+import re
+from array import array
+from bisect import bisect_left
+
+import storage
+
+"""
+    Verlauf der Mitgliederzahlen in kompakten Binärdateien.
+
+    Jede Zahlenreihe (Mitglieder insgesamt, Mitglieder ohne Rolle und jede Rolle) liegt als eigene Datei
+    <name>.bin im Verzeichnis. Pro Messung wird eine Zeile fester Breite angehängt: Zeitstempel und Anzahl als
+    vorzeichenlose 32-Bit-Zahlen. Im Speicher liegen die Reihen als array, ausgewertet wird über Slices davon, sodass
+    Minimum, Maximum und Summen in C statt in Python-Schleifen berechnet werden. Es werden höchstens max_samples
+    Messungen pro Reihe behalten (Ringpuffer), ältere werden beim Kürzen der Datei verworfen.
+"""
+
+MAX_SAMPLES = 2 * 365 * 24  # two years of hourly samples
+ROW_SIZE = 2 * array('I').itemsize
+SPARKLINE_WIDTH = 24
+SPARKLINE_CHARS = "▁▂▃▄▅▆▇█"
+RANGE_UNITS = {"h": 60 * 60, "d": 24 * 60 * 60, "t": 24 * 60 * 60, "w": 7 * 24 * 60 * 60, "m": 30 * 24 * 60 * 60,
+               "y": 365 * 24 * 60 * 60, "j": 365 * 24 * 60 * 60}
+
+
+def parse_range(text):
+    """ Length of a time range like 12h, 30d/30t, 4w, 6m or 1y/1j in seconds, None if text is no valid range """
+
+    if not (match := re.fullmatch(r"(\d+)\s*([a-z])", text.strip().lower())) or match[2] not in RANGE_UNITS:
+        return None
+    return int(match[1]) * RANGE_UNITS[match[2]]
+
+
+def sparkline(timestamps, counts, start, end, width=SPARKLINE_WIDTH):
+    """ Mean of the counts in width equal time buckets between start and end, as text. Empty buckets are blank. """
+
+    means = []
+    for bucket in range(width):
+        first = bisect_left(timestamps, start + (end - start) * bucket / width)
+        last = bisect_left(timestamps, start + (end - start) * (bucket + 1) / width)
+        means.append(sum(counts[first:last]) / (last - first) if last > first else None)
+
+    values = [mean for mean in means if mean is not None]
+    if len(values) == 0:
+        return ""
+    low, high = min(values), max(values)
+    scale = (len(SPARKLINE_CHARS) - 1) / (high - low) if high > low else 0
+    return "".join(" " if mean is None else SPARKLINE_CHARS[round((mean - low) * scale)] for mean in means)
+
+
+class Series:
+    def __init__(self, path, max_samples):
+        self.path = path
+        self.max_samples = max_samples
+        self.timestamps = array('I')
+        self.counts = array('I')
+        self.load()
+
+    def load(self):
+        rows = array('I')
+        try:
+            with open(self.path, mode='rb') as file:
+                data = file.read()
+            rows.frombytes(data[:len(data) - len(data) % ROW_SIZE])  # ignore an incompletely written last row
+        except FileNotFoundError:
+            pass
+        self.timestamps = rows[0::2]
+        self.counts = rows[1::2]
+
+    def append(self, timestamp, count):
+        if len(self.timestamps) > 0 and timestamp <= self.timestamps[-1]:
+            return  # timestamps have to increase for bisect, e.g. after the clock was set back
+        self.timestamps.append(timestamp)
+        self.counts.append(count)
+        if len(self.timestamps) > self.max_samples + self.max_samples // 10:
+            # drop the oldest samples in chunks, so the file is rewritten only every max_samples / 10 samples
+            del self.timestamps[:-self.max_samples]
+            del self.counts[:-self.max_samples]
+            storage.submit(storage.write_atomic, self.path, self.rows().tobytes())
+        else:
+            storage.submit(self.write_row, array('I', [timestamp, count]).tobytes())
+
+    def write_row(self, row):
+        with open(self.path, mode='ab') as file:
+            file.write(row)
+
+    def rows(self):
+        rows = array('I', bytes(ROW_SIZE * len(self.timestamps)))
+        rows[0::2] = self.timestamps
+        rows[1::2] = self.counts
+        return rows
+
+    def since(self, start):
+        """ Timestamps and counts of the samples taken at or after start """
+
+        first = bisect_left(self.timestamps, start)
+        return self.timestamps[first:], self.counts[first:]
+
+
+class History:
+    def __init__(self, directory, max_samples=MAX_SAMPLES):
+        self.directory = directory
+        self.max_samples = max_samples
+        self.series = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, name):
+        """ The series with the given name, loaded from its file on first access """
+
+        if name not in self.series:
+            self.series[name] = Series(os.path.join(self.directory, f"{name}.bin"), self.max_samples)
+        return self.series[name]
+
+    def append(self, name, timestamp, count):
+        self.get(name).append(int(timestamp), count)
+
+    def summary(self, name, start, end):
+        """ Sparkline, min, mean and max of a series between start and end, None if there are no samples """
+
+        timestamps, counts = self.get(name).since(start)
+        if len(counts) == 0:
+            return None
+        return {"sparkline": sparkline(timestamps, counts, start, end), "min": min(counts),
+                "mean": sum(counts) / len(counts), "max": max(counts), "samples": len(counts),
+                "first": timestamps[0], "last": timestamps[-1]}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+
+"""
+    Persistenz für die JSON-Dateien der Cogs.
+
+    `save` markiert eine Datei nur als geändert. Nach einer kurzen Wartezeit wird der zuletzt gespeicherte Stand
+    einmal serialisiert und in einem Hintergrund-Thread geschrieben. Mehrere Änderungen in dieser Zeit führen also
+    nur zu einem Schreibvorgang. Geschrieben wird in eine temporäre Datei, die nach fsync über die alte Datei
+    umbenannt wird, sodass ein Absturz beim Schreiben die Datei nicht zerstören kann.
+    `flush` schreibt alle ausstehenden Änderungen sofort und wird beim Beenden des Bots aufgerufen.
+    Fehler beim Schreiben im Hintergrund werden sofort ausgegeben und von `flush` noch einmal als WriteError gemeldet.
+"""
+
+DELAY = 2.0
+
+pending = {}
+handles = {}
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+errors = []
+
+
+class WriteError(Exception):
+    pass
+
+
+def load(path, default=None):
+    """ Load a JSON file. If the file does not exist and a default is given, the default is returned.
+    Data saved but not written yet is returned as is. """
+
+    if path in pending:
+        return pending[path]
+    try:
+        with open(path, mode='r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        if default is None:
+            raise
+        return default
+
+
+def save(path, data):
+    """ Mark data as changed. It will be written to path after DELAY seconds. """
+
+    pending[path] = data
+    if path not in handles:
+        handles[path] = asyncio.get_event_loop().call_later(DELAY, write_pending, path)
+
+
+def write_pending(path):
+    handles.pop(path, None)
+    if path in pending:
+        # serialize on the event loop, so the data can't change while it is written
+        text = json.dumps(pending.pop(path))
+        return submit(write_atomic, path, text)
+
+
+def write_later(path, data):
+    """ Write text or bytes atomically to path in the background, without debouncing """
+
+    return submit(write_atomic, path, data)
+
+
+def submit(function, *args):
+    """ Run function in the storage thread. Errors are printed and collected for flush. """
+
+    future = executor.submit(function, *args)
+    future.add_done_callback(log_error)
+    return future
+
+
+def log_error(future):
+    if exception := future.exception():
+        errors.append(exception)
+        traceback.print_exception(type(exception), exception, exception.__traceback__)
+
+
+def write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode='wb' if isinstance(data, bytes) else 'w') as file:
+            if os.path.exists(path):
+                os.fchmod(file.fileno(), os.stat(path).st_mode)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def flush():
+    """ Write all pending changes immediately and wait until everything submitted is written.
+    Raises WriteError, if writes failed since the last flush. """
+
+    for handle in handles.values():
+        handle.cancel()
+
+    futures = [write_pending(path) for path in list(pending.keys())]
+    # the single storage thread runs jobs in order, so all earlier writes and their callbacks are done after this one
+    futures.append(executor.submit(int))
+    wait([future for future in futures if future])
+
+    if errors:
+        failed = list(errors)
+        errors.clear()
+        raise WriteError(f"{len(failed)} background writes failed, the last one with {failed[-1]!r}") from failed[-1]
@@ -8,6 +8,7 @@ from discord.ext import commands
 class SupportCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
         self.channel_id = int(os.getenv("DISCORD_SUPPORT_CHANNEL"))
 
     @commands.Cog.listener()
@@ -16,7 +17,7 @@ class SupportCog(commands.Cog):
             return
 
         if type(message.channel) is discord.DMChannel:
-            channel = await self.bot.fetch_channel(self.channel_id)
+            channel = await self.resolver.channel(self.channel_id)
             files = []
 
             for attachment in message.attachments:
@@ -1,10 +1,10 @@
-import json
 import os
 import random
 import re
 import discord
 from discord.ext import commands
 
+import storage
 import utils
 from help.help import text_command_help, help, handle_error, remove_help_for, help_category
 
@@ -13,15 +13,17 @@ from help.help import text_command_help, help, handle_error, remove_help_for, he
 class TextCommandsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
         self.text_commands = {}
         self.cmd_file = os.getenv("DISCORD_TEXT_COMMANDS_FILE")
         self.load_text_commands()
+        bot.get_cog("ReactionRouter").add_embed("Neuer Motivations Text", self.handle_motivation_reaction, emojis=["👍"],
+                                                channel_id=int(os.getenv("DISCORD_MOD_CHANNEL")))
 
     def load_text_commands(self):
         """ Loads all appointments from APPOINTMENTS_FILE """
 
-        text_commands_file = open(self.cmd_file, mode='r')
-        self.text_commands = json.load(text_commands_file)
+        self.text_commands = storage.load(self.cmd_file)
         for cmd in self.text_commands:
             help_for_cmd = self.text_commands[cmd].get('help')
 
@@ -37,8 +39,7 @@ class TextCommandsCog(commands.Cog):
             text_command_help(cmd, brief=brief, category=category)
 
     def save_text_commands(self):
-        text_commands_file = open(self.cmd_file, mode='w')
-        json.dump(self.text_commands, text_commands_file)
+        storage.save(self.cmd_file, self.text_commands)
 
     @commands.Cog.listener(name="on_message")
     async def process_text_commands(self, message):
@@ -275,7 +276,7 @@ class TextCommandsCog(commands.Cog):
     )
     @commands.command(name="add-motivation")
     async def cmd_add_motivation(self, ctx, *text):
-        mod_channel = await self.bot.fetch_channel(int(os.getenv("DISCORD_MOD_CHANNEL")))
+        mod_channel = await self.resolver.channel(os.getenv("DISCORD_MOD_CHANNEL"))
 
         embed = discord.Embed(title="Neuer Motivations Text",
                               description=f"<@!{ctx.author.id}> Möchte folgenden Motivationstext hinzufügen:")
@@ -292,24 +293,15 @@ class TextCommandsCog(commands.Cog):
         description = embed.description
         ctx = await self.bot.get_context(message)
         member_id = description[3:21]
-        guild = message.guild
-        member = await guild.fetch_member(member_id)
+        member = await self.resolver.member(message.guild.id, member_id)
 
         await utils.send_dm(member,
                             f"Herzlichen Glückwunsch, dein Vorschlag für einen neuen Motivationstext wurde angenommen.\n\n{text}")
         await self.cmd_add_text_command(ctx, "!motivation", text)
         await message.delete()
 
-    @commands.Cog.listener()
-    async def on_raw_reaction_add(self, payload):
-        if payload.user_id == self.bot.user.id:
-            return
-
-        if payload.emoji.name in ["👍"]:
-            channel = await self.bot.fetch_channel(payload.channel_id)
-            message = await channel.fetch_message(payload.message_id)
-            if len(message.embeds) > 0 and message.embeds[0].title == "Neuer Motivations Text":
-                await self.motivation_approved(message)
+    async def handle_motivation_reaction(self, payload, message):
+        await self.motivation_approved(message)
 
     async def cog_command_error(self, ctx, error):
         await handle_error(ctx, error)
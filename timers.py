@@ -0,0 +1,106 @@
+import asyncio
+import heapq
+import os
+import time
+import traceback
+
+from discord.ext import commands, tasks
+
+import storage
+
+"""
+    DISCORD_TIMERS_FILE - Datendatei für geplante Aktionen. Wenn diese noch nicht existiert wird sie angelegt.
+
+    Cogs registrieren mit `register(kind, callback)` eine Callback-Funktion `async def callback(payload)` und planen
+    mit `schedule(kind, due, payload, key)` deren Ausführung. Geplante Aktionen werden gespeichert, überleben
+    einen Neustart und werden nach einer Downtime nachgeholt.
+"""
+
+
+class Timers(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.file = os.getenv("DISCORD_TIMERS_FILE")
+        self.callbacks = {}
+        self.jobs = {}
+        self.queue = []
+        self.running = set()
+        self.wakeup = asyncio.Event()
+        self.load()
+        self.timer.start()
+
+    def load(self):
+        for key, job in storage.load(self.file, {}).items():
+            self.add_job(key, job)
+
+    def save(self):
+        storage.save(self.file, self.jobs)
+
+    def register(self, kind, callback):
+        """ Register the callback, that is called with the payload of every due job of the given kind """
+
+        self.callbacks[kind] = callback
+
+    def add_job(self, key, job):
+        self.jobs[key] = job
+        heapq.heappush(self.queue, (job["due"], key))
+        self.wakeup.set()
+
+    def schedule(self, kind, due, payload, key):
+        """ Schedule a job at due (datetime). An existing job with the same key is replaced. """
+
+        self.add_job(key, {"kind": kind, "due": due.timestamp(), "payload": payload})
+        self.save()
+
+    def cancel(self, key):
+        if self.jobs.pop(key, None):
+            self.save()
+
+    def is_scheduled(self, entry):
+        due, key = entry
+        return (job := self.jobs.get(key)) and job["due"] == due
+
+    @tasks.loop(seconds=0)
+    async def timer(self):
+        self.wakeup.clear()
+        while len(self.queue) > 0 and not self.is_scheduled(self.queue[0]):
+            heapq.heappop(self.queue)
+
+        timeout = None
+        if len(self.queue) > 0:
+            timeout = max(0.0, self.queue[0][0] - time.time())
+
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+            return  # queue has changed, calculate next timeout
+        except asyncio.TimeoutError:
+            pass
+
+        while len(self.queue) > 0 and self.queue[0][0] <= time.time():
+            entry = heapq.heappop(self.queue)
+            if self.is_scheduled(entry):
+                _, key = entry
+                job = self.jobs.pop(key)
+                self.save()
+                self.start(job)
+
+    def start(self, job):
+        """ Run the callback of a job in its own task, so a slow callback doesn't delay other due jobs """
+
+        task = asyncio.create_task(self.run(job))
+        self.running.add(task)  # keep a reference until the task is done
+        task.add_done_callback(self.running.discard)
+
+    async def run(self, job):
+        if not (callback := self.callbacks.get(job["kind"])):
+            print(f"No callback registered for timer job of kind {job['kind']}")
+            return
+
+        try:
+            await callback(job["payload"])
+        except Exception:
+            traceback.print_exc()
+
+    @timer.before_loop
+    async def before_timer(self):
+        await self.bot.wait_until_ready()
@@ -1,10 +1,10 @@
-import json
 import os
 import re
 
 import discord
 from discord.ext import commands
 from help.help import help, handle_error
+import storage
 
 
 class TopsCog(commands.Cog):
@@ -17,8 +17,7 @@ class TopsCog(commands.Cog):
     def load_tops(self):
         """ Loads all TOPs from TOPS_FILE """
 
-        tops_file = open(self.tops_file, mode='r')
-        self.tops = json.load(tops_file)
+        self.tops = storage.load(self.tops_file)
 
     @help(
       brief="Fügt einen Tagesordnungspunkt zum Channel hinzu.",
@@ -38,8 +37,7 @@ class TopsCog(commands.Cog):
         channel_tops = self.tops.get(str(channel.id))
         channel_tops.append(top)
 
-        tops_file = open(self.tops_file, mode='w')
-        json.dump(self.tops, tops_file)
+        storage.save(self.tops_file, self.tops)
 
     @help(
       brief="Löscht einen Tagesordnungspunkt in einem Channel.",
@@ -64,8 +62,7 @@ class TopsCog(commands.Cog):
                 if len(channel_tops) == 0:
                     self.tops.pop(str(channel.id))
 
-                tops_file = open(self.tops_file, mode='w')
-                json.dump(self.tops, tops_file)
+                storage.save(self.tops_file, self.tops)
 
     @help(
         brief="Löscht alle Tagesordnungspunkte in einem Channel.",
@@ -78,8 +75,7 @@ class TopsCog(commands.Cog):
 
         if str(channel.id) in self.tops:
             self.tops.pop(str(channel.id))
-            tops_file = open(self.tops_file, mode='w')
-            json.dump(self.tops, tops_file)
+            storage.save(self.tops_file, self.tops)
 
     @help(
         brief="Zeigt alle Tagesordnungspunkte in einem Channel an.",
@@ -10,6 +10,7 @@ from help.help import help, handle_error
 class WelcomeCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.resolver = bot.get_cog("Resolver")
         self.channel_id = int(os.getenv("DISCORD_WELCOME_CHANNEL"))
         self.message_id = int(os.getenv("DISCORD_WELCOME_MSG"))
 
@@ -21,8 +22,7 @@ class WelcomeCog(commands.Cog):
     @commands.command("update-welcome")
     @commands.check(utils.is_mod)
     async def cmd_update_welcome(self, ctx):
-        channel = await self.bot.fetch_channel(self.channel_id)
-        message = await channel.fetch_message(self.message_id)
+        message = await self.resolver.message(self.channel_id, self.message_id)
 
         embed = discord.Embed(title="Herzlich Willkommen auf dem Discord von Studierenden für Studierende.",
                               description="Disclaimer: Das hier ist kein offizieller Kanal der Fernuni. Hier findet auch keine offizielle Betreuung durch die Fernuni statt. Dieser Discord dient zum Austausch unter Studierenden über einzelne Kurse, um sich gegenseitig helfen zu können, aber auch um über andere Themen in einen Austausch zu treten. Es soll KEIN Ersatz für die Kanäle der Lehrgebiete sein, wie die Newsgroups, Moodle-Foren und was es noch so gibt. Der Discord soll die Möglichkeit bieten, feste Lerngruppen zu finden und sich in diesen gegenseitig zu helfen und zu treffen. Zudem soll er durch den Austausch in den Kanälen auch eine Art flexible Lerngruppe zu einzelnen Kursen ermöglichen. Daher ist unser Apell an euch: Nutzt bitte auch die Betreuungsangebote der entsprechenden Kurse, in die ihr eingeschrieben seid. ")
@@ -61,7 +61,7 @@ class WelcomeCog(commands.Cog):
     @commands.Cog.listener()
     async def on_member_update(self, before, after):
         if before.pending != after.pending and not after.pending:
-            channel = await self.bot.fetch_channel(int(os.getenv("DISCORD_GREETING_CHANNEL")))
+            channel = await self.resolver.channel(os.getenv("DISCORD_GREETING_CHANNEL"))
             await channel.send(f"Herzlich Willkommen <@!{before.id}> im Kreise der Studentinnen :wave:")
 
     async def cog_command_error(self, ctx, error):